@@ -0,0 +1,226 @@
+# benchmarks/load_test.py
+# Headless load test: scripts full participant journeys through the apps with
+# streamlit's AppTest and runs many of them concurrently against the in-memory
+# storage backend. Reports per-rerun latency percentiles, memory per session
+# and throughput.
+#
+# AppTest swaps a process-global runtime in and out around every run, so it
+# cannot be driven from several threads at once. Concurrency therefore comes
+# from worker processes, each playing its share of participants back to back.
+#
+#   python benchmarks/load_test.py --app both --participants 200 --concurrency 20
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Never touch GitHub from a load test
+os.environ.setdefault("MONTYHALL_STORAGE", "fake")
+
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+APPS = {
+    "montyhall": os.path.join(ROOT, "montyhall.py"),
+    "montyhall_not_ok": os.path.join(ROOT, "montyhall_not_ok.py"),
+}
+
+
+class Participant:
+    # One scripted session; every interaction is timed as one rerun
+    def __init__(self, script, seed):
+        self.at = AppTest.from_file(script, default_timeout=60)
+        self.rng = random.Random(seed)
+        self.latencies = []
+
+    def run(self, action=None):
+        t0 = time.perf_counter()
+        if action is not None:
+            action()
+        self.at.run()
+        self.latencies.append(time.perf_counter() - t0)
+        if self.at.exception:
+            raise RuntimeError(self.at.exception[0].message)
+
+    def button(self, label=None, key=None):
+        for b in self.at.button:
+            if (key is not None and b.key == key) or (label is not None and b.label == label):
+                return b
+        raise LookupError(f"No button {label or key!r}")
+
+    def click(self, label=None, key=None):
+        self.run(self.button(label, key).click)
+
+    def state(self, name):
+        return getattr(self.at.session_state["game"], name)
+
+    def play_round(self, n_cards=3):
+        first = self.rng.randrange(n_cards)
+        self.run(self.button(key=f"card_{first}").click)
+        flipped = self.state("flipped_card")
+        if self.rng.random() < 0.5:
+            second = first
+        else:
+            second = next(i for i in range(n_cards) if i not in (first, flipped))
+        self.run(self.button(key=f"card_{second}").click)
+
+
+def journey_montyhall(p, trials=3, rounds=3):
+    p.run()
+    p.run(lambda: p.at.text_input(key="name_input").input(f"load_{id(p)}"))
+    p.click("✅ Confirm Name")
+    p.click("Yes, trial runs")
+    for t in range(trials):
+        p.play_round()
+        if t < trials - 1:
+            p.click("🔄 Again")
+    p.click("🚀 Ready for Real Experiment")
+    p.click("✅ Start Real Experiment")
+    for r in range(rounds):
+        p.play_round()
+        if r < rounds - 1:
+            p.click("Next Round")
+    p.click("📊 Show Summary")
+
+
+def journey_not_ok(p, trials=10, per_round=3):
+    p.run()
+    p.run(lambda: p.at.text_input[0].input(f"load_{id(p)}"))
+    p.click("✅ Confirm Name and Continue")
+    for t in range(trials):
+        p.play_round()
+        if t < trials - 1:
+            p.click(key="trial_next_top")
+    # The results button shows on the rerun after the last trial is logged
+    if not any(b.key == "trial_see_results_top" for b in p.at.button):
+        p.run()
+    p.click(key="trial_see_results_top")
+    p.click("🚀 Go to Real Experiment")
+    p.click("✅ I understand, start Round 1")
+    for round_set in (1, 2):
+        if round_set == 2:
+            p.click("✅ I understand, start Round 2")
+        for _ in range(per_round):
+            p.play_round()
+            p.click("Next")
+
+
+JOURNEYS = {"montyhall": journey_montyhall, "montyhall_not_ok": journey_not_ok}
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return float("nan")
+    k = (len(values) - 1) * q
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def memory_per_session(app, sessions=5):
+    # Bytes retained per live session, measured on a sequential sample after
+    # one warm-up journey so module imports and caches are not counted
+    JOURNEYS[app](Participant(APPS[app], seed=9_999))
+    tracemalloc.start()
+    base = tracemalloc.take_snapshot()
+    alive = []
+    for i in range(sessions):
+        p = Participant(APPS[app], seed=10_000 + i)
+        JOURNEYS[app](p)
+        alive.append(p)
+    grown = sum(s.size_diff for s in tracemalloc.take_snapshot().compare_to(base, "filename"))
+    tracemalloc.stop()
+    return grown / sessions
+
+
+def run_participants(app, seeds):
+    # Worker process: play each participant in turn
+    from page_flow import RERUNS
+
+    RERUNS.reset()
+    latencies, errors = [], []
+    for seed in seeds:
+        p = Participant(APPS[app], seed=seed)
+        try:
+            JOURNEYS[app](p)
+        except Exception as e:
+            errors.append(repr(e))
+        latencies.extend(p.latencies)
+    counts = RERUNS.snapshot()
+    return latencies, errors, counts["runs"], counts["actions"]
+
+
+def load_test(app, participants, concurrency, seed=0):
+    latencies, errors = [], []
+    runs = actions = 0
+    seeds = [seed + i for i in range(participants)]
+    shares = [seeds[w::concurrency] for w in range(concurrency)]
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=concurrency) as pool:
+        for lat, err, r, a in pool.map(run_participants, [app] * concurrency, shares):
+            latencies.extend(lat)
+            errors.extend(err)
+            runs += r
+            actions += a
+    elapsed = time.perf_counter() - t0
+    return {
+        "app": app,
+        "participants": participants,
+        "concurrency": concurrency,
+        "reruns": len(latencies),
+        # script runs per button click as counted by the app (page_flow.RERUNS)
+        "runs_per_action": runs / actions if actions else float("nan"),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else "",
+        "elapsed_s": elapsed,
+        "journeys_per_s": participants / elapsed,
+        "reruns_per_s": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else float("nan"),
+    }
+
+
+def report(result, mem):
+    print(f"\n== {result['app']}: {result['participants']} participants, "
+          f"concurrency {result['concurrency']} ==")
+    print(f"reruns: {result['reruns']}  errors: {result['errors']}  {result['first_error']}")
+    print(f"rerun latency ms  p50 {result['p50_ms']:.1f}  p95 {result['p95_ms']:.1f}  "
+          f"p99 {result['p99_ms']:.1f}  mean {result['mean_ms']:.1f}")
+    print(f"throughput: {result['journeys_per_s']:.2f} journeys/s, "
+          f"{result['reruns_per_s']:.1f} reruns/s")
+    print(f"script runs per action: {result['runs_per_action']:.2f}")
+    print(f"memory per session: {mem / 1024:.1f} KiB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless load test for the Streamlit apps")
+    parser.add_argument("--app", choices=["montyhall", "montyhall_not_ok", "both"], default="both")
+    parser.add_argument("--participants", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--memory-sample", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    apps = list(APPS) if args.app == "both" else [args.app]
+    # The round WAL of benchmark sessions goes to a scratch directory, never
+    # into round_wal/ next to real sessions. Worker processes inherit it.
+    wal_dir = tempfile.mkdtemp(prefix="montyhall_wal_")
+    os.environ["MONTYHALL_WAL_DIR"] = wal_dir
+    try:
+        for app in apps:
+            result = load_test(app, args.participants, args.concurrency, args.seed)
+            # In a fresh process too: AppTest replaces __main__ while it runs a
+            # script, which would break pickling the worker functions afterwards
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                mem = pool.submit(memory_per_session, app, args.memory_sample).result()
+            report(result, mem)
+    finally:
+        shutil.rmtree(wal_dir, ignore_errors=True)
@@ -0,0 +1,102 @@
+# benchmarks/startup.py
+# Cold-start benchmark for the app entry points. Every sample runs in a fresh
+# interpreter, like a new server process or container, and measures:
+#   import_ms  importing streamlit plus the app's own modules
+#   render_ms  the first script run (the instructions page) through AppTest
+# It also lists which heavy libraries were loaded by then; pandas,
+# matplotlib and PyGithub should not be needed for the first page.
+#
+#   python benchmarks/startup.py --app both --repeat 5
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+APPS = {
+    "montyhall": os.path.join(ROOT, "montyhall.py"),
+    "montyhall_not_ok": os.path.join(ROOT, "montyhall_not_ok.py"),
+}
+HEAVY = ["numpy", "pandas", "matplotlib", "github", "pyarrow"]
+
+
+def app_modules(app):
+    # The repo's own modules the app imports at top level, read from its
+    # import statements so the list cannot drift from the app
+    import ast
+
+    with open(APPS[app], encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    names = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.append(node.module)
+    return [n for n in dict.fromkeys(names) if os.path.exists(os.path.join(ROOT, n + ".py"))]
+
+
+def child(app):
+    # One cold sample; prints a JSON line
+    import importlib
+
+    sys.path.insert(0, ROOT)
+    os.environ.setdefault("MONTYHALL_STORAGE", "fake")
+    t0 = time.perf_counter()
+    import streamlit  # noqa: F401
+
+    t1 = time.perf_counter()
+    for name in app_modules(app):
+        importlib.import_module(name)
+    t2 = time.perf_counter()
+    imported = [m for m in HEAVY if m in sys.modules]
+
+    from streamlit.testing.v1 import AppTest
+
+    t3 = time.perf_counter()
+    at = AppTest.from_file(APPS[app], default_timeout=60)
+    at.run()
+    t4 = time.perf_counter()
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    print(json.dumps({
+        "streamlit_ms": (t1 - t0) * 1000,
+        "import_ms": (t2 - t0) * 1000,
+        "app_import_ms": (t2 - t1) * 1000,
+        "render_ms": (t4 - t3) * 1000,
+        "heavy_after_import": imported,
+        "heavy_after_render": [m for m in HEAVY if m in sys.modules],
+    }))
+
+
+def sample(app):
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", app],
+                         capture_output=True, text=True, check=True, cwd=ROOT)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def report(app, samples):
+    print(f"== {app} ({len(samples)} cold starts)")
+    for key in ("streamlit_ms", "app_import_ms", "import_ms", "render_ms"):
+        values = [s[key] for s in samples]
+        print(f"  {key:14s} median {statistics.median(values):8.1f}  min {min(values):8.1f}")
+    print(f"  loaded after import: {', '.join(samples[-1]['heavy_after_import']) or '-'}")
+    print(f"  loaded after first render: {', '.join(samples[-1]['heavy_after_render']) or '-'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold-start benchmark for the Streamlit apps")
+    parser.add_argument("--app", choices=["montyhall", "montyhall_not_ok", "both"], default="both")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--child", choices=list(APPS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child)
+        sys.exit(0)
+    apps = list(APPS) if args.app == "both" else [args.app]
+    for app in apps:
+        report(app, [sample(app) for _ in range(args.repeat)])
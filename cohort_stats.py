@@ -0,0 +1,168 @@
+# cohort_stats.py
+# Running aggregate of every stored participant log, for the live dashboard.
+# Each log is parsed once (through ingest_logs.normalize_frame, so every
+# schema version is handled) and folded into small counters, keyed by path and
+# content hash: a refresh only reads files that are new or changed (a
+# session's file replaced by a later snapshot swaps out its old counts), and
+# results written by a ResultWriter in this process are added as soon as
+# they are stored.
+import io
+import logging
+import posixpath
+import threading
+
+import pandas as pd
+import streamlit as st
+
+from ingest_logs import normalize_frame
+from persistence import LOG_DIR, add_write_listener, content_hash, make_backend
+
+logger = logging.getLogger(__name__)
+
+
+class CohortAggregate:
+    def __init__(self, backend=None, directory=LOG_DIR):
+        self.backend = backend
+        self.directory = directory
+        self.version = 0  # bumped on every change, for cache keys
+        self.rounds = 0
+        self._files = {}  # path -> (content hash, that file's contribution)
+        self._by_phase = {}  # (phase_type, switched) -> [rounds, wins]
+        self._by_participant = {}  # participant -> [rounds, switches, wins]
+        self._final_points = {}  # session_id -> points after the last round
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _contribution(df):
+        # What one log adds to the counters
+        switched = df["switched"].fillna(False).astype(bool)
+        won = df["result"].fillna(False).astype(bool)
+        phase = df["phase_type"].astype("float64")
+        by_phase = (pd.DataFrame({"phase_type": phase, "switched": switched, "won": won})
+                    .groupby(["phase_type", "switched"], dropna=False)["won"].agg(["size", "sum"]))
+        points = df["points_after_round"].dropna()
+        return {
+            "rounds": len(df),
+            "by_phase": {(None if pd.isna(phase_type) else int(phase_type), bool(sw)): (int(size), int(wins))
+                         for (phase_type, sw), (size, wins) in by_phase.iterrows()},
+            "participant": df["participant"].iat[0],
+            "counts": (len(df), int(switched.sum()), int(won.sum())),
+            "final": (df["session_id"].iat[0], int(points.iat[-1])) if len(points) else None,
+        }
+
+    def _apply(self, part, sign):
+        # Caller holds self._lock. sign -1 takes a file's contribution back out.
+        for key, values in part["by_phase"].items():
+            entry = self._by_phase.setdefault(key, [0, 0])
+            for i, v in enumerate(values):
+                entry[i] += sign * v
+            if entry[0] == 0:
+                del self._by_phase[key]
+        entry = self._by_participant.setdefault(part["participant"], [0, 0, 0])
+        for i, v in enumerate(part["counts"]):
+            entry[i] += sign * v
+        if entry[0] == 0:
+            del self._by_participant[part["participant"]]
+        if part["final"] is not None:
+            session_id, points = part["final"]
+            if sign > 0:
+                self._final_points[session_id] = points
+            else:
+                self._final_points.pop(session_id, None)
+        self.rounds += sign * part["rounds"]
+
+    def add(self, path, content, digest=None):
+        # Fold one log into the counters. A path seen with the same content is
+        # ignored; new content for a known path (a session's file replaced by
+        # a later snapshot) replaces that file's earlier contribution. A log
+        # that cannot be parsed is skipped and not marked as seen.
+        if not path.endswith(".csv"):
+            return 0
+        digest = content_hash(content) if digest is None else digest
+        with self._lock:
+            if self._files.get(path, (None,))[0] == digest:
+                return 0
+        try:
+            df = normalize_frame(pd.read_csv(io.StringIO(content)), posixpath.basename(path))
+        except (ValueError, pd.errors.ParserError) as e:
+            logger.warning("Skipping %s: %s", path, e)
+            return 0
+        part = self._contribution(df)
+        with self._lock:
+            old = self._files.get(path)
+            if old is not None and old[0] == digest:
+                return 0  # folded in by another thread meanwhile
+            if old is not None:
+                self._apply(old[1], -1)
+            self._apply(part, +1)
+            self._files[path] = (digest, part)
+            self.version += 1
+        return len(df)
+
+    def remove(self, path):
+        with self._lock:
+            old = self._files.pop(path, None)
+            if old is not None:
+                self._apply(old[1], -1)
+                self.version += 1
+
+    def add_files(self, files):
+        # ResultWriter listener: files is a list of (path, content) pairs
+        for path, content in files:
+            if posixpath.dirname(path) == self.directory:
+                self.add(path, content)
+
+    def refresh(self):
+        # Read only logs that are new or whose content changed, and drop
+        # logs that were deleted from storage. Returns the number of logs read.
+        if self.backend is None:
+            return 0
+        hashes = self.backend.file_hashes(self.directory)
+        with self._lock:
+            known = {path: digest for path, (digest, _) in self._files.items()}
+        for path in set(known) - set(hashes):
+            self.remove(path)
+        changed = [path for path, digest in hashes.items()
+                   if path.endswith(".csv") and known.get(path) != digest]
+        added = 0
+        for path in sorted(changed):
+            try:
+                content = self.backend.read_file(path)
+            except Exception:
+                continue  # not readable yet; picked up by a later refresh
+            if self.add(path, content, hashes[path]):
+                added += 1
+        return added
+
+    @property
+    def sessions(self):
+        return len(self._files)
+
+    def win_rates_by_phase(self):
+        with self._lock:
+            rows = [(phase, sw, n, wins) for (phase, sw), (n, wins) in self._by_phase.items()]
+        out = pd.DataFrame(rows, columns=["phase_type", "switched", "rounds", "wins"])
+        out["phase_type"] = out["phase_type"].astype("Int8")
+        out["win_rate"] = out["wins"] / out["rounds"]
+        return out.sort_values(["phase_type", "switched"], ignore_index=True)
+
+    def participants(self):
+        with self._lock:
+            rows = [(p, *counts) for p, counts in self._by_participant.items()]
+        out = pd.DataFrame(rows, columns=["participant", "rounds", "switches", "wins"])
+        out["switch_rate"] = out["switches"] / out["rounds"]
+        out["win_rate"] = out["wins"] / out["rounds"]
+        return out.sort_values("participant", ignore_index=True)
+
+    def final_points(self):
+        with self._lock:
+            return pd.Series(self._final_points, name="points", dtype="int64")
+
+
+@st.cache_resource
+def get_cohort_aggregate():
+    # One aggregate per server process. It listens to the process's result
+    # writer and reads earlier sessions from storage.
+    aggregate = CohortAggregate(make_backend(st.secrets))
+    add_write_listener(aggregate.add_files)
+    return aggregate
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+from cohort_stats import get_cohort_aggregate
+
+st.set_page_config(page_title="Cohort Dashboard", page_icon="📈", layout="wide")
+
+REFRESH_SECONDS = 30
+
+aggregate = get_cohort_aggregate()
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def points_histogram(version, _points):
+    # Counts per 50-point bin, cached until the aggregate changes
+    counts, edges = np.histogram(_points, bins=np.arange(0, max(_points.max(), 0) + 100, 50))
+    labels = [f"{int(lo)}–{int(hi) - 1}" for lo, hi in zip(edges[:-1], edges[1:])]
+    return pd.DataFrame({"sessions": counts}, index=labels)
+
+
+@st.fragment(run_every=REFRESH_SECONDS)
+def live_view():
+    try:
+        aggregate.refresh()
+    except Exception as e:
+        st.warning(f"⚠️ Couldn't read new results: {e}")
+
+    st.title("📈 Live Cohort Dashboard")
+    participants = aggregate.participants()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Participants", len(participants))
+    col2.metric("Sessions", aggregate.sessions)
+    col3.metric("Rounds", aggregate.rounds)
+    total = participants["rounds"].sum()
+    col4.metric("Switch rate", f"{participants['switches'].sum() / total:.0%}" if total else "–")
+
+    st.subheader("Win rate by phase_type")
+    st.caption("montyhall.py: 0 = trial, 1 = experiment. montyhall_not_ok.py: 1 / 2 = round set.")
+    by_phase = aggregate.win_rates_by_phase()
+    if len(by_phase):
+        by_phase["action"] = by_phase["switched"].map({True: "Switch", False: "Stay"})
+        chart = by_phase.pivot_table(index="phase_type", columns="action", values="win_rate")
+        st.bar_chart(chart, stack=False)
+        st.dataframe(by_phase.drop(columns="action"), use_container_width=True)
+
+    st.subheader("Switch rate per participant")
+    st.dataframe(participants, use_container_width=True)
+
+    st.subheader("Final points per session")
+    points = aggregate.final_points()
+    if len(points):
+        st.bar_chart(points_histogram(aggregate.version, points.to_numpy()))
+    else:
+        st.write("No scored sessions yet.")
+    st.caption(f"Refreshes every {REFRESH_SECONDS} s; only new logs are read.")
+
+
+live_view()
@@ -0,0 +1,131 @@
+# dedup_logs.py
+# Finds redundant participant logs in the result store and removes them.
+# Two kinds are found, always within one participant's files:
+#   duplicate  byte-identical to an earlier file (same content hash)
+#   snapshot   an earlier upload of a session that a later file continues;
+#              its rows are a strict prefix of the later file's rows
+# The first copy of a duplicate and the longest snapshot are kept. Nothing is
+# deleted without --apply; a dry run only prints the plan. With --apply the
+# removed files' rows also leave the consolidated dataset (ingest_logs.py):
+# their date partitions are rewritten without them, their manifest entries
+# are dropped and the query index is rebuilt.
+#
+#   python dedup_logs.py [--root .] [--window 60] [--out consolidated] [--apply]
+#   python dedup_logs.py --configured --apply   # the app's storage (MONTYHALL_STORAGE)
+import argparse
+import os
+import posixpath
+from datetime import timedelta
+
+from ingest_logs import OUT_DIR, drop_sessions, load_manifest, parse_log_name, save_manifest
+from persistence import LOG_DIR, LocalBackend, content_hash
+
+WINDOW_MINUTES = 60  # files further apart are treated as separate sessions
+
+
+def read_logs(backend, directory=LOG_DIR):
+    # path -> (participant, time, content) for every parseable log name
+    logs = {}
+    for path in backend.list_files(directory):
+        if not path.endswith(".csv"):
+            continue
+        try:
+            player, when = parse_log_name(path)
+        except ValueError:
+            print(f"Skipping {path}: not a participant log name")
+            continue
+        logs[path] = (player, when, backend.read_file(path))
+    return logs
+
+
+def is_snapshot_of(earlier, later):
+    # Same header, and `later` only adds whole rows after `earlier`'s
+    return (len(later) > len(earlier) and later.startswith(earlier)
+            and (earlier.endswith("\n") or later[len(earlier)] == "\n"))
+
+
+def plan(logs, window=timedelta(minutes=WINDOW_MINUTES)):
+    # -> {removed path: (kept path, reason)}
+    by_player = {}
+    for path, (player, when, content) in logs.items():
+        by_player.setdefault(player, []).append((when, path, content))
+
+    removed = {}
+    for files in by_player.values():
+        files.sort()
+        first_copy = {}
+        for when, path, content in files:
+            digest = content_hash(content)
+            if digest in first_copy:
+                removed[path] = (first_copy[digest], "duplicate")
+            else:
+                first_copy[digest] = path
+        remaining = [f for f in files if f[1] not in removed]
+        for i, (when, path, content) in enumerate(remaining):
+            later = [p for w, p, c in remaining[i + 1:]
+                     if w - when <= window and is_snapshot_of(content, c)]
+            if later:
+                removed[path] = (later[-1], "snapshot")
+
+    # Point every removed file at the file that is actually kept
+    for path, (kept, reason) in removed.items():
+        while kept in removed:
+            kept = removed[kept][0]
+        removed[path] = (kept, reason)
+    return removed
+
+
+def drop_from_dataset(names, out_dir=OUT_DIR):
+    # Remove the rows of the given log file names from the consolidated
+    # dataset. Returns the number of rows dropped.
+    manifest = load_manifest(out_dir)
+    names = [name for name in names if name in manifest]
+    if not names:
+        return 0
+    dropped = drop_sessions(names, out_dir)
+    for name in names:
+        del manifest[name]
+    save_manifest(out_dir, manifest)
+    from log_query import build_index
+
+    build_index(out_dir)
+    return dropped
+
+
+def dedup(backend, directory=LOG_DIR, window=timedelta(minutes=WINDOW_MINUTES), apply=False,
+          out_dir=OUT_DIR):
+    removed = plan(read_logs(backend, directory), window)
+    for path, (kept, reason) in sorted(removed.items()):
+        print(f"{'remove' if apply else 'would remove'} {path}  ({reason} of {kept})")
+    if apply and removed:
+        backend.delete_batch(sorted(removed), f"Remove {len(removed)} duplicate result files")
+        if os.path.isdir(out_dir):
+            rows = drop_from_dataset([posixpath.basename(p) for p in removed], out_dir)
+            print(f"Dropped {rows} rows of removed files from {out_dir}")
+    return removed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Remove duplicate and superseded participant logs")
+    parser.add_argument("--root", default=".", help="local checkout that holds the log directory")
+    parser.add_argument("--configured", action="store_true",
+                        help="use the app's configured storage instead of --root")
+    parser.add_argument("--logs", default=LOG_DIR)
+    parser.add_argument("--out", default=OUT_DIR, help="consolidated dataset to keep in step")
+    parser.add_argument("--window", type=float, default=WINDOW_MINUTES,
+                        help="minutes within which an earlier snapshot counts as superseded")
+    parser.add_argument("--apply", action="store_true", help="delete the files (default: dry run)")
+    args = parser.parse_args()
+    if args.configured:
+        import streamlit as st
+
+        from persistence import make_backend
+
+        backend = make_backend(st.secrets)
+    else:
+        backend = LocalBackend(args.root)
+    removed = dedup(backend, args.logs, timedelta(minutes=args.window), args.apply, args.out)
+    if not removed:
+        print("No duplicates found")
+    elif not args.apply:
+        print(f"{len(removed)} file(s) would be removed; rerun with --apply to delete them")
@@ -0,0 +1,278 @@
+# effect_stats.py
+# Bootstrap confidence intervals and permutation p-values for the switch vs
+# stay analysis, over the consolidated logs (see ingest_logs.py).
+# Every test works on per-participant count vectors, never on row loops:
+# - pooled CIs resample participants (cluster bootstrap) with multinomial
+#   weight matrices, so one batch of resamples is a single matrix product;
+# - per-participant CIs come straight from the binomial distribution, which
+#   is the exact bootstrap distribution of one participant's win rate;
+# - permutation tests flip signs of paired differences per participant, or
+#   draw hypergeometric splits for pooled counts.
+# Resamples are split into fixed-size shards seeded like simulation.py, so
+# results are identical for any number of workers.
+#
+#   python effect_stats.py [--out consolidated] [--resamples 100000] [--workers 4]
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from ingest_logs import OUT_DIR, read_dataset
+from simulation import shard_sizes
+
+DEFAULT_RESAMPLES = 100_000
+CONFIDENCE = 0.95
+# Resamples per shard, and the largest (resamples x participants) weight
+# matrix built at once
+DEFAULT_SHARD = 25_000
+BATCH_CELLS = 10_000_000
+
+COLUMNS = ["participant", "phase_type", "result", "switched", "points_after_round"]
+# montyhall_not_ok.py: switching costs 10 in round set 1, staying in round set 2
+COST_ROUND_SETS = (1, 2)
+
+
+# --- Per-participant counts ---
+def load_rounds(out_dir=OUT_DIR):
+    df = read_dataset(out_dir, columns=COLUMNS)
+    return df[df["switched"].notna()]
+
+
+def cost_rounds(df):
+    # Scored experiment rounds of montyhall_not_ok.py. That app is the only one
+    # writing points_after_round and stores current_round_set in phase_type.
+    return df[df["points_after_round"].notna() & df["phase_type"].isin(COST_ROUND_SETS)]
+
+
+def participant_counts(df, group=None):
+    # rounds, switches, wins and wins split by action per participant (and group)
+    keys = ["participant"] if group is None else ["participant", group]
+    switched = df["switched"].fillna(False).astype(bool)
+    won = df["result"].fillna(False).astype(bool)
+    counts = (pd.DataFrame({"rounds": 1, "switches": switched, "wins": won,
+                            "switch_wins": switched & won, "stay_wins": ~switched & won})
+              .astype("int64")
+              .groupby([df[k] for k in keys], observed=True).sum())
+    counts["stays"] = counts["rounds"] - counts["switches"]
+    if group is not None:
+        counts = counts.unstack(group, fill_value=0)
+    return counts
+
+
+# --- Resampling kernels: kernel(rng, size, *args) -> array of `size` statistics ---
+def _batch_rows(width):
+    return max(1, BATCH_CELLS // max(width, 1))
+
+
+def _cluster_ratio_kernel(rng, size, num, den):
+    # num, den: (participants, k). Each resample redraws participants with
+    # replacement and returns the pooled ratios sum(num) / sum(den), (size, k).
+    n = len(num)
+    out = np.empty((size, num.shape[1]))
+    step = _batch_rows(n)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for start in range(0, size, step):
+            rows = min(step, size - start)
+            idx = rng.integers(0, n, size=(rows, n))
+            out[start:start + rows] = num[idx].sum(axis=1) / den[idx].sum(axis=1)
+    return out
+
+
+def _sign_flip_kernel(rng, size, diffs):
+    # Mean paired difference with a random sign per participant
+    n = len(diffs)
+    out = np.empty(size)
+    step = _batch_rows(n)
+    for start in range(0, size, step):
+        rows = min(step, size - start)
+        signs = rng.integers(0, 2, size=(rows, n), dtype=np.int8) * 2 - 1
+        out[start:start + rows] = (signs @ diffs) / n
+    return out
+
+
+def _hypergeometric_kernel(rng, size, k1, n1, k2, n2):
+    # Rate difference (group 2 - group 1) after shuffling the group labels of
+    # all n1 + n2 binary outcomes
+    k1_perm = rng.hypergeometric(k1 + k2, n1 + n2 - k1 - k2, n1, size=size)
+    return (k1 + k2 - k1_perm) / n2 - k1_perm / n1
+
+
+def _run_shard(job):
+    kernel, entropy, shard_index, size, args = job
+    seq = np.random.SeedSequence(entropy, spawn_key=(shard_index,))
+    return kernel(np.random.default_rng(seq), size, *args)
+
+
+def resample(kernel, args, n_resamples=DEFAULT_RESAMPLES, seed=None, workers=1,
+             shard_size=DEFAULT_SHARD):
+    # Run `kernel` for n_resamples statistics, sharded over a process pool.
+    # Returns (statistics, entropy) so the run can be reproduced.
+    entropy = np.random.SeedSequence(seed).entropy
+    jobs = [(kernel, entropy, i, n, args)
+            for i, n in enumerate(shard_sizes(n_resamples, shard_size))]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) <= 1:
+        parts = list(map(_run_shard, jobs))
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            parts = list(pool.map(_run_shard, jobs))
+    return np.concatenate(parts), entropy
+
+
+def percentile_ci(stats, confidence=CONFIDENCE):
+    alpha = (1 - confidence) / 2
+    low, high = np.nanquantile(stats, [alpha, 1 - alpha], axis=0)
+    return low, high
+
+
+def p_value(stats, observed):
+    # Two-sided, with the observed statistic counted as one permutation
+    extreme = np.count_nonzero(np.abs(stats) >= abs(observed) - 1e-12)
+    return (extreme + 1) / (len(stats) + 1)
+
+
+# --- Tests ---
+def bootstrap_rate(num, den, n_resamples=DEFAULT_RESAMPLES, confidence=CONFIDENCE,
+                   seed=None, workers=1):
+    # Pooled rate sum(num) / sum(den) with a participant-level bootstrap CI
+    num = np.asarray(num, dtype=np.float64).reshape(-1, 1)
+    den = np.asarray(den, dtype=np.float64).reshape(-1, 1)
+    stats, entropy = resample(_cluster_ratio_kernel, (num, den), n_resamples, seed, workers)
+    low, high = percentile_ci(stats[:, 0], confidence)
+    return {"estimate": num.sum() / den.sum(), "low": low, "high": high,
+            "participants": len(num), "resamples": n_resamples, "seed": entropy}
+
+
+def bootstrap_rate_difference(num1, den1, num2, den2, n_resamples=DEFAULT_RESAMPLES,
+                              confidence=CONFIDENCE, seed=None, workers=1):
+    # rate2 - rate1, both rates from the same resampled participants
+    num = np.column_stack([num1, num2]).astype(np.float64)
+    den = np.column_stack([den1, den2]).astype(np.float64)
+    stats, entropy = resample(_cluster_ratio_kernel, (num, den), n_resamples, seed, workers)
+    low, high = percentile_ci(stats[:, 1] - stats[:, 0], confidence)
+    rates = num.sum(axis=0) / den.sum(axis=0)
+    return {"estimate": rates[1] - rates[0], "rate1": rates[0], "rate2": rates[1],
+            "low": low, "high": high, "participants": len(num),
+            "resamples": n_resamples, "seed": entropy}
+
+
+def participant_rate_cis(k, n, confidence=CONFIDENCE):
+    # Per-participant bootstrap CI of k / n. Resampling a participant's own
+    # rounds gives Binomial(n, k / n) wins, so the percentile interval is read
+    # off the binomial CDF: the limit of infinitely many resamples, no draws.
+    k = np.asarray(k, dtype=np.int64)
+    n = np.asarray(n, dtype=np.int64)
+    alpha = (1 - confidence) / 2
+    low = np.full(len(n), np.nan)
+    high = np.full(len(n), np.nan)
+    for size in np.unique(n[n > 0]):
+        idx = np.flatnonzero(n == size)
+        cdf = np.cumsum(_binomial_pmf(size, k[idx] / size), axis=1)
+        low[idx] = np.argmax(cdf >= alpha - 1e-12, axis=1) / size
+        high[idx] = np.argmax(cdf >= 1 - alpha - 1e-12, axis=1) / size
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rate = k / n
+    return pd.DataFrame({"k": k, "n": n, "rate": rate, "low": low, "high": high})
+
+
+def _binomial_pmf(n, p):
+    # P(X = 0..n) for X ~ Binomial(n, p), one row per entry of p
+    j = np.arange(n + 1)
+    log_choose = np.concatenate([[0.0], np.cumsum(np.log((n - j[:-1]) / j[1:]))])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_pmf = (log_choose + j * np.log(p[:, None])
+                   + (n - j) * np.log1p(-p[:, None]))
+    # 0 * log(0) terms at p = 0 or p = 1
+    log_pmf = np.where(((p[:, None] == 0) & (j == 0)) | ((p[:, None] == 1) & (j == n)),
+                       0.0, log_pmf)
+    return np.exp(np.nan_to_num(log_pmf, nan=-np.inf))
+
+
+def paired_permutation_test(diffs, n_resamples=DEFAULT_RESAMPLES, seed=None, workers=1):
+    # H0: no within-participant effect, so each difference is equally likely
+    # to have either sign
+    diffs = np.asarray(diffs, dtype=np.float64)
+    observed = diffs.mean()
+    stats, entropy = resample(_sign_flip_kernel, (diffs,), n_resamples, seed, workers)
+    return {"observed": observed, "p_value": p_value(stats, observed),
+            "participants": len(diffs), "resamples": n_resamples, "seed": entropy}
+
+
+def pooled_permutation_test(k1, n1, k2, n2, n_resamples=DEFAULT_RESAMPLES, seed=None, workers=1):
+    # H0: both groups share one rate; statistic is rate2 - rate1
+    k1, n1, k2, n2 = int(k1), int(n1), int(k2), int(n2)
+    observed = k2 / n2 - k1 / n1
+    stats, entropy = resample(_hypergeometric_kernel, (k1, n1, k2, n2), n_resamples, seed, workers)
+    return {"observed": observed, "p_value": p_value(stats, observed),
+            "resamples": n_resamples, "seed": entropy}
+
+
+# --- Reports over the consolidated logs ---
+def switch_win_report(df, n_resamples=DEFAULT_RESAMPLES, seed=None, workers=1):
+    counts = participant_counts(df)
+    seeds = [int(s) for s in np.random.SeedSequence(seed).generate_state(2)]
+    return {
+        "switch_win_rate": bootstrap_rate(counts["switch_wins"], counts["switches"],
+                                          n_resamples, seed=seeds[0], workers=workers),
+        "stay_win_rate": bootstrap_rate(counts["stay_wins"], counts["stays"],
+                                        n_resamples, seed=seeds[1], workers=workers),
+        "per_participant": participant_rate_cis(counts["switch_wins"], counts["switches"])
+                           .set_index(counts.index),
+    }
+
+
+def cost_effect_report(df, n_resamples=DEFAULT_RESAMPLES, seed=None, workers=1):
+    # Switch rate in round set 2 (staying costs) minus round set 1 (switching costs)
+    rounds_df = cost_rounds(df)
+    if rounds_df.empty:
+        raise ValueError("No scored round-set rounds in the logs")
+    counts = participant_counts(rounds_df, group="phase_type")
+    r1, r2 = COST_ROUND_SETS
+    switches = counts["switches"].reindex(columns=list(COST_ROUND_SETS), fill_value=0)
+    rounds = counts["rounds"].reindex(columns=list(COST_ROUND_SETS), fill_value=0)
+    seeds = [int(s) for s in np.random.SeedSequence(seed).generate_state(3)]
+    both = (rounds[r1] > 0) & (rounds[r2] > 0)
+    diffs = switches[r2][both] / rounds[r2][both] - switches[r1][both] / rounds[r1][both]
+    if not both.any() or not rounds[r1].sum() or not rounds[r2].sum():
+        raise ValueError("The round-set effect needs rounds from both round sets")
+    return {
+        "difference": bootstrap_rate_difference(switches[r1], rounds[r1], switches[r2], rounds[r2],
+                                                n_resamples, seed=seeds[0], workers=workers),
+        "paired": paired_permutation_test(diffs, n_resamples, seed=seeds[1], workers=workers),
+        "pooled": pooled_permutation_test(switches[r1].sum(), rounds[r1].sum(),
+                                          switches[r2].sum(), rounds[r2].sum(),
+                                          n_resamples, seed=seeds[2], workers=workers),
+    }
+
+
+def _print_ci(label, res):
+    print(f"{label}: {res['estimate']:.3f} [{res['low']:.3f}, {res['high']:.3f}] "
+          f"({res['participants']} participants)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bootstrap CIs and permutation tests over the consolidated logs")
+    parser.add_argument("--out", default=OUT_DIR)
+    parser.add_argument("--resamples", type=int, default=DEFAULT_RESAMPLES)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    df = load_rounds(args.out)
+    wins = switch_win_report(df, args.resamples, args.seed, args.workers)
+    _print_ci("Switch win rate", wins["switch_win_rate"])
+    _print_ci("Stay win rate", wins["stay_win_rate"])
+    print(wins["per_participant"].to_string(float_format="%.3f"))
+
+    try:
+        cost = cost_effect_report(df, args.resamples, args.seed, args.workers)
+    except ValueError as e:
+        print(f"\nSkipping round-set effect: {e}")
+    else:
+        diff, paired, pooled = cost["difference"], cost["paired"], cost["pooled"]
+        print(f"\nSwitch rate, round set 1: {diff['rate1']:.3f}, round set 2: {diff['rate2']:.3f}")
+        _print_ci("Round set 2 - round set 1", diff)
+        print(f"Paired permutation p = {paired['p_value']:.4f} ({paired['participants']} participants)")
+        print(f"Pooled permutation p = {pooled['p_value']:.4f}")
@@ -0,0 +1,91 @@
+# game_engine.py
+# Shared rules for the card game with N cards where the host reveals k losers.
+# Used by the Streamlit pages (one game at a time) and by the simulator
+# (vectorized batches). Nothing here builds O(N) lists per game.
+import random
+
+HIDDEN = "🂠"
+TROPHY = "🏆"
+LOSER = "❌"
+
+
+def check_rules(n_cards, reveals):
+    # The player must still have at least one other closed card to switch to
+    if n_cards < 3:
+        raise ValueError("n_cards must be at least 3")
+    if not 1 <= reveals <= n_cards - 2:
+        raise ValueError("reveals must be between 1 and n_cards - 2")
+
+
+# --- Single game (Streamlit pages) ---
+def new_trophy(n_cards=3, rng=random):
+    return rng.randrange(n_cards)
+
+
+def _skip_excluded(p, excluded):
+    # Map an index into the cards that are not `excluded` (sorted) to a position
+    for e in excluded:
+        if p >= e:
+            p += 1
+    return p
+
+
+def host_reveal(first, trophy, n_cards=3, reveals=1, rng=random):
+    # Sorted list of `reveals` losing cards that are neither the first pick nor
+    # the trophy. Samples from a range of size N-|excluded| and shifts past the
+    # excluded positions, so the cost is O(k log k) regardless of N.
+    check_rules(n_cards, reveals)
+    excluded = sorted({first, trophy})
+    picks = rng.sample(range(n_cards - len(excluded)), reveals)
+    return sorted(_skip_excluded(p, excluded) for p in picks)
+
+
+def host_flip(first, trophy, n_cards=3, rng=random, tie_break=None):
+    # The classic single reveal. With a tie_break (0 <= tie_break < n_cards-1,
+    # e.g. from a pre-generated schedule) the flipped card is chosen
+    # deterministically among the host's candidates instead of at random.
+    if tie_break is None:
+        return host_reveal(first, trophy, n_cards, 1, rng)[0]
+    check_rules(n_cards, 1)
+    excluded = sorted({first, trophy})
+    return _skip_excluded(tie_break % (n_cards - len(excluded)), excluded)
+
+
+def card_faces(n_cards, phase, trophy, revealed=(), game_over=False):
+    # Emoji for each card position given the current phase
+    if phase == "reveal_all" or game_over:
+        return [TROPHY if i == trophy else LOSER for i in range(n_cards)]
+    if phase == "second_pick":
+        return [LOSER if i in revealed else HIDDEN for i in range(n_cards)]
+    return [HIDDEN] * n_cards
+
+
+# --- Analytic win probabilities ---
+def win_probabilities(n_cards=3, reveals=1):
+    # Returns (switch, stay). Staying wins with 1/N. Switching to a uniformly
+    # chosen other closed card wins when the first pick was wrong, (N-1)/N,
+    # and then hits the trophy among the N-1-k remaining cards.
+    check_rules(n_cards, reveals)
+    stay = 1 / n_cards
+    switch = (n_cards - 1) / (n_cards * (n_cards - 1 - reveals))
+    return switch, stay
+
+
+# --- Vectorized sampling (simulator) ---
+def sample_outcomes(rng, size, n_cards=3, reveals=1):
+    # One batch of `size` games scored for both strategies, returns
+    # (switch_wins, stay_wins). The host never reveals the trophy, so after a
+    # wrong first pick it is one of the N-1-k closed alternatives and a
+    # uniform switch finds it with probability 1/(N-1-k).
+    import numpy as np
+
+    check_rules(n_cards, reveals)
+    trophy = rng.integers(0, n_cards, size)
+    first = rng.integers(0, n_cards, size)
+    stay_hit = first == trophy
+    alternatives = n_cards - 1 - reveals
+    if alternatives == 1:
+        switch_hit = ~stay_hit
+    else:
+        switch_hit = ~stay_hit & (rng.integers(0, alternatives, size) == 0)
+    return int(np.count_nonzero(switch_hit)), int(np.count_nonzero(stay_hit))
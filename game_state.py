@@ -0,0 +1,131 @@
+# game_state.py
+# Per-session state as one slotted dataclass instead of a dozen separate
+# st.session_state keys. get_state() is the single initialization path; every
+# rerun after the first is one dict lookup. With a shared session store
+# (session_store.py) the object is also saved after every action and a
+# worker that has not seen the session restores it from there.
+import pickle
+import secrets
+from dataclasses import dataclass, field
+
+import streamlit as st
+
+from game_engine import new_trophy
+from page_flow import after_action
+from session_store import SESSION_STORE
+from round_log import RoundLog, GAME_LOG_COLUMNS, TRIAL_LOG_COLUMNS, EXPERIMENT_LOG_COLUMNS
+from summary_stats import OutcomeCounts
+
+STATE_KEY = "game"
+VERSION_KEY = "game_version"  # store version this worker last loaded or saved
+SESSION_PARAM = "sid"
+
+
+@dataclass(slots=True)
+class RoundState:
+    # The card game currently on screen
+    n_cards: int = 3
+    trophy_pos: int = -1
+    first_choice: int | None = None
+    flipped_card: int | None = None
+    second_choice: int | None = None
+    phase: str = "first_pick"  # first_pick, second_pick, reveal_all
+    game_over: bool = False
+    tie_break: int | None = None  # host's flip choice when the round comes from a schedule
+
+    def __post_init__(self):
+        if self.trophy_pos < 0:
+            self.trophy_pos = new_trophy(self.n_cards)
+
+    def reset_round(self, layout=None):
+        # layout: a trial_schedule.RoundLayout, or None for a live random draw
+        if layout is None:
+            self.trophy_pos = new_trophy(self.n_cards)
+            self.tie_break = None
+        else:
+            self.trophy_pos, self.tie_break = layout
+        self.first_choice = None
+        self.flipped_card = None
+        self.second_choice = None
+        self.phase = "first_pick"
+        self.game_over = False
+
+
+@dataclass(slots=True)
+class PracticeState(RoundState):
+    # montyhall.py: optional trial runs followed by a fixed number of rounds
+    player_name: str | None = None
+    trial_mode: bool | None = None
+    experiment_rounds: int = 0
+    experiment_finished: bool = False
+    ready_page: bool = False
+    log: RoundLog = field(default_factory=lambda: RoundLog(GAME_LOG_COLUMNS))
+    log_id: str = field(default_factory=lambda: secrets.token_hex(8))  # session key in the round WAL
+    slot: int | None = None  # cohort slot of the round schedule (trial_schedule.enroll)
+
+
+@dataclass(slots=True)
+class ExperimentState(RoundState):
+    # montyhall_not_ok.py: practice trials, then two scored round sets
+    player_name: str | None = None
+    email: str = ""  # optional
+    # page values: instructions, trial, trial_summary, round1_instr, round1, round2_instr, round2, summary
+    page: str = "instructions"
+    trial_runs_done: int = 0
+    trial_log: RoundLog = field(default_factory=lambda: RoundLog(TRIAL_LOG_COLUMNS))
+    trial_outcomes: OutcomeCounts = field(default_factory=OutcomeCounts)
+    experiment_round: int = 0  # number of completed experiment trials (0..6)
+    current_round_set: int = 1  # 1 or 2
+    experiment_log: RoundLog = field(default_factory=lambda: RoundLog(EXPERIMENT_LOG_COLUMNS))
+    experiment_outcomes: OutcomeCounts = field(default_factory=OutcomeCounts)
+    points: int = 50  # start points when real experiment begins
+    trials_played: int = 0  # all practice trials, also across "Another 10 Trial Rounds"
+    results_saved: bool = False
+    log_id: str = field(default_factory=lambda: secrets.token_hex(8))  # session key in the round WAL
+    slot: int | None = None  # cohort slot of the round schedule (trial_schedule.enroll)
+
+
+def get_state(cls, **kwargs):
+    # The session's state object, created (or restored) on the first run
+    state = st.session_state.get(STATE_KEY)
+    if state is None:
+        if SESSION_STORE is not None:
+            state = _restore(cls)
+        if state is None:
+            state = cls(**kwargs)
+        st.session_state[STATE_KEY] = state
+    return state
+
+
+# --- Shared session store ---
+def _session_id():
+    # Kept in the URL, so a reconnect to any worker finds the session
+    sid = st.query_params.get(SESSION_PARAM)
+    if not sid:
+        sid = st.query_params[SESSION_PARAM] = secrets.token_urlsafe(16)
+    return sid
+
+
+def _restore(cls):
+    row = SESSION_STORE.load(_session_id())
+    version, state = (0, None) if row is None else (row[0], pickle.loads(row[1]))
+    st.session_state[VERSION_KEY] = version
+    return state if isinstance(state, cls) else None
+
+
+def save_state():
+    # After every action. If another worker saved newer progress for this
+    # session in the meantime, continue from that instead.
+    state = st.session_state.get(STATE_KEY)
+    if SESSION_STORE is None or state is None:
+        return
+    sid = _session_id()
+    blob = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+    version = SESSION_STORE.save(sid, blob, st.session_state.get(VERSION_KEY, 0))
+    if version is None:
+        version, blob = SESSION_STORE.load(sid)
+        st.session_state[STATE_KEY] = pickle.loads(blob)
+    st.session_state[VERSION_KEY] = version
+
+
+after_action(save_state)
@@ -0,0 +1,246 @@
+# ingest_logs.py
+# Consolidates the per-participant CSVs in player_logs/ into one Parquet
+# dataset partitioned by date. All historical schema versions are mapped to
+# one canonical layout, and a manifest records which files were ingested so
+# a rerun only processes new logs. Logs are rewritten in place when a
+# session grows (the round WAL and the upload index keep one file per
+# session), so a file whose sha256 no longer matches its manifest entry has
+# its old rows dropped from its date partition and is read again.
+#
+#   python ingest_logs.py [--logs player_logs] [--out consolidated]
+import argparse
+import hashlib
+import json
+import os
+import uuid
+from datetime import datetime
+
+import pandas as pd
+
+LOG_DIR = "player_logs"
+OUT_DIR = "consolidated"
+MANIFEST = "_manifest.json"
+
+# Canonical columns and their pandas dtypes
+CANONICAL = {
+    "session_id": "string",
+    "participant": "string",
+    "session_time": "datetime64[ns]",
+    "date": "string",
+    "schema_version": "int8",
+    "round_number": "Int32",
+    "row_in_file": "Int32",  # 0-based position in the CSV, i.e. play order
+    "first_choice": "Int8",
+    "flipped_card": "Int8",
+    "second_choice": "Int8",
+    "trophy_card": "Int8",
+    "result": "boolean",
+    "switched": "boolean",
+    "phase_type": "Int8",
+    "points_after_round": "Int32",
+    "switch_win": "Int8",
+    "stay_win": "Int8",
+    "email": "string",
+    "schedule_key": "string",
+}
+
+# Old column names -> canonical names
+ALIASES = {
+    "monty_flipped": "flipped_card",
+    "won": "result",
+    "points": "points_after_round",
+    "trial_number": "round_number",
+}
+
+
+def schema_version(columns):
+    # 0: first_choice,monty_flipped,second_choice,won
+    # 1: round_number..phase_type
+    # 2: adds trophy_card / points_after_round / switch_win / stay_win
+    # 3: adds email
+    # 4: adds schedule_key
+    cols = set(columns)
+    if "won" in cols:
+        return 0
+    if "schedule_key" in cols:
+        return 4
+    if "email" in cols:
+        return 3
+    if cols & {"points_after_round", "switch_win", "stay_win"}:
+        return 2
+    return 1
+
+
+def parse_log_name(filename):
+    # "{player_name}_{YYYYmmdd}_{HHMMSS}.csv" -> (player_name, datetime)
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    player, day, clock = stem.rsplit("_", 2)
+    return player, datetime.strptime(day + clock, "%Y%m%d%H%M%S")
+
+
+def to_bool(series):
+    return series.map(lambda v: v if pd.isna(v) or isinstance(v, bool)
+                      else str(v).strip().lower() in ("true", "1", "1.0"),
+                      na_action="ignore").astype("boolean")
+
+
+def normalize_frame(raw, filename):
+    # Map one participant CSV (any schema version) to the canonical layout
+    player, when = parse_log_name(filename)
+    df = raw.rename(columns=ALIASES)
+    n = len(df)
+    out = pd.DataFrame(index=range(n))
+    out["session_id"] = os.path.splitext(os.path.basename(filename))[0]
+    out["participant"] = player
+    out["session_time"] = when
+    out["date"] = when.strftime("%Y-%m-%d")
+    out["schema_version"] = schema_version(raw.columns)
+    out["row_in_file"] = range(n)
+    for col in CANONICAL:
+        if col in out:
+            continue
+        if col in df:
+            out[col] = df[col].to_numpy()
+        else:
+            out[col] = pd.NA
+    if out["round_number"].isna().all():
+        out["round_number"] = range(1, n + 1)
+    out["result"] = to_bool(out["result"])
+    out["switched"] = (pd.to_numeric(out["first_choice"]) != pd.to_numeric(out["second_choice"]))
+    # trophy_card was written as a float in some versions (0.0)
+    for col, dtype in CANONICAL.items():
+        if dtype.startswith("Int") or dtype.startswith("int"):
+            out[col] = pd.to_numeric(out[col], errors="coerce").round()
+        out[col] = out[col].astype(dtype)
+    return out
+
+
+def read_log(path):
+    return normalize_frame(pd.read_csv(path), path)
+
+
+def load_manifest(out_dir):
+    path = os.path.join(out_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(out_dir, manifest):
+    path = os.path.join(out_dir, MANIFEST)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def file_digest(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def new_log_files(log_dir, manifest):
+    # Files not ingested yet, and files changed since they were; the digest
+    # is only recomputed when size or mtime differ from the manifest entry
+    for name in sorted(os.listdir(log_dir)):
+        if not name.endswith(".csv"):
+            continue
+        entry = manifest.get(name)
+        if entry is None:
+            yield name
+            continue
+        stat = os.stat(os.path.join(log_dir, name))
+        if (entry.get("size"), entry.get("mtime_ns")) == (stat.st_size, stat.st_mtime_ns):
+            continue
+        if file_digest(os.path.join(log_dir, name)) != entry["sha256"]:
+            yield name
+
+
+def drop_sessions(names, out_dir=OUT_DIR):
+    # Rewrite the date partitions holding the given log files' rows without
+    # them; the manifest is left to the caller. Returns the number of rows
+    # dropped.
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    sessions = {}  # date partition -> session ids to drop
+    for name in names:
+        _, when = parse_log_name(name)
+        sessions.setdefault(f"date={when.strftime('%Y-%m-%d')}", set()).add(os.path.splitext(name)[0])
+    dropped = 0
+    for partition, ids in sessions.items():
+        directory = os.path.join(out_dir, partition)
+        if not os.path.isdir(directory):
+            continue
+        parts = sorted(os.path.join(directory, n) for n in os.listdir(directory) if n.endswith(".parquet"))
+        table = pa.concat_tables([pq.read_table(p) for p in parts], promote_options="default")
+        keep = table.filter(pc.invert(pc.is_in(table["session_id"], pa.array(sorted(ids)))))
+        if len(keep) == len(table):
+            continue
+        dropped += len(table) - len(keep)
+        # Write the new file before deleting the old ones
+        pq.write_table(keep, os.path.join(directory, f"part-{uuid.uuid4().hex[:12]}-0.parquet"))
+        for p in parts:
+            os.remove(p)
+    return dropped
+
+
+def ingest(log_dir=LOG_DIR, out_dir=OUT_DIR):
+    # Append every new or changed log to the dataset. Returns the number of
+    # files ingested.
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = load_manifest(out_dir)
+    frames, entries = [], {}
+    for name in new_log_files(log_dir, manifest):
+        path = os.path.join(log_dir, name)
+        try:
+            stat = os.stat(path)
+            frame = read_log(path)
+        except (ValueError, pd.errors.ParserError) as e:
+            print(f"Skipping {name}: {e}")
+            continue
+        frames.append(frame)
+        entries[name] = {"sha256": file_digest(path), "rows": len(frame),
+                         "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                         "ingested_at": datetime.now().isoformat(timespec="seconds")}
+    if not frames:
+        return 0
+    # Changed files replace their old rows. Their manifest entries keep the
+    # old digest until the new rows are written, so a crash in between is
+    # repaired by the next run.
+    replaced = [name for name in entries if name in manifest]
+    if replaced:
+        drop_sessions(replaced, out_dir)
+    table = pa.Table.from_pandas(pd.concat(frames, ignore_index=True), preserve_index=False)
+    # Unique file names per run, so earlier partitions are never overwritten
+    run_id = uuid.uuid4().hex[:12]
+    pq.write_to_dataset(table, out_dir, partition_cols=["date"],
+                        basename_template=f"part-{run_id}-{{i}}.parquet")
+    manifest.update(entries)
+    save_manifest(out_dir, manifest)
+    return len(entries)
+
+
+def read_dataset(out_dir=OUT_DIR, columns=None):
+    import pyarrow.parquet as pq
+
+    return pq.read_table(out_dir, columns=columns).to_pandas()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Consolidate player_logs/ into a Parquet dataset")
+    parser.add_argument("--logs", default=LOG_DIR)
+    parser.add_argument("--out", default=OUT_DIR)
+    args = parser.parse_args()
+    count = ingest(args.logs, args.out)
+    print(f"Ingested {count} new or changed log file(s) into {args.out}")
+    if count:
+        from log_query import build_index
+
+        rows = build_index(args.out)
+        print(f"Rebuilt query index over {rows} rounds")
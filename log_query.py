@@ -0,0 +1,129 @@
+# log_query.py
+# Query layer over the consolidated participant logs (see ingest_logs.py).
+# build_index() writes the rows as an uncompressed Arrow IPC file sorted by
+# participant, plus small precomputed aggregate tables. LogIndex memory-maps
+# those files, so dashboard queries read only the aggregates or one
+# participant's slice instead of loading every row.
+import json
+import os
+
+import pandas as pd
+
+from ingest_logs import OUT_DIR, read_dataset
+
+INDEX_DIR = "_index"
+ROWS_FILE = "rounds.arrow"
+AGG_FILE = "by_participant_phase_action.arrow"
+OFFSETS_FILE = "participant_offsets.json"
+
+# The experiment app stores current_round_set in the phase_type column
+GROUP_ALIASES = {"current_round_set": "phase_type"}
+
+
+def _write_arrow(table, path):
+    import pyarrow as pa
+
+    tmp = path + ".tmp"
+    with pa.OSFile(tmp, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp, path)
+
+
+def build_index(out_dir=OUT_DIR):
+    # Rebuild the row file and aggregates from the consolidated dataset
+    import pyarrow as pa
+
+    index_dir = os.path.join(out_dir, INDEX_DIR)
+    os.makedirs(index_dir, exist_ok=True)
+    df = read_dataset(out_dir)
+    df["date"] = df["date"].astype("string")
+    # Play order is the row order of each file; round_number restarts per
+    # phase_type in the montyhall.py layout. Datasets ingested before
+    # row_in_file existed fall back to round_number.
+    order = "row_in_file" if "row_in_file" in df else "round_number"
+    df = df.sort_values(["participant", "session_time", "session_id", order], kind="stable",
+                        ignore_index=True)
+    _write_arrow(pa.Table.from_pandas(df, preserve_index=False),
+                 os.path.join(index_dir, ROWS_FILE))
+
+    agg = (df.assign(wins=df["result"].fillna(False).astype("int64"))
+             .groupby(["participant", "phase_type", "switched"], dropna=False, observed=True)
+             .agg(rounds=("wins", "size"), wins=("wins", "sum"),
+                  sessions=("session_id", "nunique"))
+             .reset_index())
+    _write_arrow(pa.Table.from_pandas(agg, preserve_index=False),
+                 os.path.join(index_dir, AGG_FILE))
+
+    # participant -> (first row, row count) in the sorted row file
+    sizes = df.groupby("participant", sort=False).size()
+    offsets, start = {}, 0
+    for participant, count in sizes.items():
+        offsets[participant] = [start, int(count)]
+        start += int(count)
+    with open(os.path.join(index_dir, OFFSETS_FILE), "w", encoding="utf-8") as f:
+        json.dump(offsets, f)
+    return len(df)
+
+
+class LogIndex:
+    def __init__(self, out_dir=OUT_DIR):
+        self.index_dir = os.path.join(out_dir, INDEX_DIR)
+        self._rows = None
+        self._agg = None
+        self._offsets = None
+
+    def _open(self, name):
+        import pyarrow as pa
+
+        # Zero-copy: pages are only read when a query touches them
+        source = pa.memory_map(os.path.join(self.index_dir, name), "r")
+        return pa.ipc.open_file(source).read_all()
+
+    @property
+    def rows(self):
+        if self._rows is None:
+            self._rows = self._open(ROWS_FILE)
+        return self._rows
+
+    @property
+    def aggregates(self):
+        if self._agg is None:
+            self._agg = self._open(AGG_FILE).to_pandas()
+        return self._agg
+
+    @property
+    def offsets(self):
+        if self._offsets is None:
+            with open(os.path.join(self.index_dir, OFFSETS_FILE), encoding="utf-8") as f:
+                self._offsets = json.load(f)
+        return self._offsets
+
+    def participants(self):
+        return list(self.offsets)
+
+    def win_rate_by_action(self, by="phase_type"):
+        # Rounds, wins and win rate per (group, switched)
+        by = GROUP_ALIASES.get(by, by)
+        out = (self.aggregates.groupby([by, "switched"], dropna=False)[["rounds", "wins"]]
+               .sum().reset_index())
+        out["win_rate"] = out["wins"] / out["rounds"]
+        return out
+
+    def switch_rate_per_participant(self):
+        agg = self.aggregates
+        switched = agg[agg["switched"] == True].groupby("participant")["rounds"].sum()
+        total = agg.groupby("participant")["rounds"].sum()
+        out = pd.DataFrame({"rounds": total,
+                            "switches": switched.reindex(total.index, fill_value=0)})
+        out["switch_rate"] = out["switches"] / out["rounds"]
+        return out.reset_index()
+
+    def points_trajectory(self, participant):
+        # points_after_round per round for one participant, in play order
+        if participant not in self.offsets:
+            raise KeyError(f"Unknown participant: {participant}")
+        start, count = self.offsets[participant]
+        part = self.rows.slice(start, count).select(
+            ["session_id", "round_number", "phase_type", "points_after_round"])
+        return part.to_pandas()
@@ -1,56 +1,103 @@
 import streamlit as st
-import random
-import pandas as pd
 from datetime import datetime
-from github import Github
+from game_engine import host_flip, card_faces
+from game_state import PracticeState, get_state
+from round_wal import finish_session, record_round
+from page_flow import PHASE_FLOW, RERUNS, counted
+from trial_schedule import enroll, schedule_for
+from profiling import stage, show_admin_view
 
 st.set_page_config(page_title="Card Game Experiment", page_icon="🏆", layout="wide")
+RERUNS.script_run()
 
 max_experiment_rounds = 3
+N_CARDS = 3
 
-# --- Initialize session state ---
-if "player_name" not in st.session_state:
-    st.session_state.player_name = None
-if "trial_mode" not in st.session_state:
-    st.session_state.trial_mode = None
-if "experiment_rounds" not in st.session_state:
-    st.session_state.experiment_rounds = 0
-if "cards" not in st.session_state:
-    st.session_state.cards = ["🂠"]*3
-if "trophy_pos" not in st.session_state:
-    st.session_state.trophy_pos = random.randint(0,2)
-if "first_choice" not in st.session_state:
-    st.session_state.first_choice = None
-if "flipped_card" not in st.session_state:
-    st.session_state.flipped_card = None
-if "second_choice" not in st.session_state:
-    st.session_state.second_choice = None
-if "phase" not in st.session_state:
-    st.session_state.phase = "first_pick"
-if "game_over" not in st.session_state:
-    st.session_state.game_over = False
-if "log_df" not in st.session_state:
-    st.session_state.log_df = pd.DataFrame(columns=["round_number","first_choice","flipped_card","second_choice","result","phase_type"])
-if "experiment_finished" not in st.session_state:
-    st.session_state.experiment_finished = False
-if "logged_this_round" not in st.session_state:
-    st.session_state.logged_this_round = False
-if "ready_page" not in st.session_state:
-    st.session_state.ready_page = False  # New flag for the ready page
-
-# --- Reset game function ---
-def reset_game():
-    st.session_state.cards = ["🂠"]*3
-    st.session_state.trophy_pos = random.randint(0,2)
-    st.session_state.first_choice = None
-    st.session_state.flipped_card = None
-    st.session_state.second_choice = None
-    st.session_state.phase = "first_pick"
-    st.session_state.game_over = False
-    st.session_state.logged_this_round = False
+# --- Session state: one object, created on the first run ---
+with stage("state_init"):
+    game = get_state(PracticeState, n_cards=N_CARDS)
+show_admin_view()
+
+# --- Next round's layout comes from the session's pre-generated schedule ---
+def new_round():
+    if game.trial_mode:
+        stream, index = "trial", game.log.count("phase_type", 0)
+    else:
+        stream, index = "experiment", game.experiment_rounds
+    if game.slot is None:
+        game.slot = enroll()
+    game.reset_round(schedule_for(game.slot, stream, N_CARDS).layout(index))
+
+# --- Callbacks: they run before the script, so each click is a single run ---
+def confirm_name():
+    name_input = st.session_state.name_input
+    if name_input.strip() != "":
+        game.player_name = name_input.strip()
+    else:
+        st.warning("Please enter a valid name.")
+
+def choose_trials():
+    game.trial_mode = True
+    new_round()
+
+def choose_experiment():
+    game.ready_page = True  # Show ready page first
+
+def start_real_experiment():
+    game.trial_mode = False
+    game.experiment_rounds = 0
+    game.ready_page = False
+    new_round()
+    st.success(f"Real experiment started — {max_experiment_rounds} rounds to complete!")
+
+def pick_card(i):
+    if game.phase == "first_pick":
+        game.first_choice = i
+        game.flipped_card = host_flip(i, game.trophy_pos, N_CARDS, tie_break=game.tie_break)
+        game.phase = PHASE_FLOW.next(game.phase, "pick")
+    elif game.phase == "second_pick" and i != game.flipped_card:
+        game.second_choice = i
+        game.phase = PHASE_FLOW.next(game.phase, "pick")
+        game.game_over = True
+        # log the finished round once, right here
+        with stage("log_round"):
+            phase_type = 0 if game.trial_mode else 1
+            record_round(
+                game.log_id, game.player_name, game.log,
+                round_number=game.log.count("phase_type", phase_type) + 1,
+                first_choice=game.first_choice,
+                flipped_card=game.flipped_card,
+                second_choice=game.second_choice,
+                trophy_card=game.trophy_pos,
+                result=game.second_choice == game.trophy_pos,
+                phase_type=phase_type,
+                schedule_key=game.slot
+            )
+
+def next_round():
+    if game.trial_mode:
+        new_round()
+    else:
+        game.experiment_rounds += 1
+        if game.experiment_rounds < max_experiment_rounds:
+            new_round()
+
+def ready_for_real():
+    game.ready_page = True
+
+def show_summary():
+    try:
+        # The rounds are already in the WAL; the compactor writes the file and
+        # queues it for the background writer, so the participant never waits
+        with stage("persist"):
+            path = finish_session(game.log_id, game.player_name, game.log, datetime.now())
+        st.success(f"Results queued for saving as {path}")
+    except Exception as e:
+        st.error(f"⚠️ Couldn't save: {e}")
+    game.experiment_finished = True
 
 # --- Instructions and name input ---
-if st.session_state.trial_mode is None and not st.session_state.ready_page:
+if game.trial_mode is None and not game.ready_page:
     st.title("🏆 Card Game Experiment")
     st.write("""
 Instructions:
@@ -62,34 +109,23 @@ You will be shown three cards and your goal is to find the trophy 🏆 behind on
 The winning trophy card is then revealed!
 """)
 
-if st.session_state.player_name is None:
-    name_input = st.text_input("Enter your first and last name:", key="name_input")
-    if st.button("✅ Confirm Name"):
-        if name_input.strip() != "":
-            st.session_state.player_name = name_input.strip()
-            st.rerun()
-        else:
-            st.warning("Please enter a valid name.")
+if game.player_name is None:
+    st.text_input("Enter your first and last name:", key="name_input")
+    st.button("✅ Confirm Name", on_click=counted("confirm_name", confirm_name))
     st.stop()
 
-player_name = st.session_state.player_name
-
 # --- Trial or experiment selection ---
-if st.session_state.trial_mode is None and not st.session_state.ready_page:
+if game.trial_mode is None and not game.ready_page:
     st.write("Do you want to do a few trial runs first?")
     col1, col2 = st.columns(2)
-    if col1.button("Yes, trial runs"):
-        st.session_state.trial_mode = True
-        st.rerun()
-    if col2.button("No, start experiment"):
-        st.session_state.ready_page = True  # Show ready page first
-        st.rerun()
+    col1.button("Yes, trial runs", on_click=counted("choose_trials", choose_trials))
+    col2.button("No, start experiment", on_click=counted("choose_experiment", choose_experiment))
     st.stop()
 
-phase_type = 0 if st.session_state.trial_mode else 1
+phase_type = 0 if game.trial_mode else 1
 
 # --- Ready page for real experiment ---
-if st.session_state.ready_page:
+if game.ready_page:
     st.title("🚀 Are you ready for the real experiment?")
     st.write(f"You will complete {max_experiment_rounds} rounds.")
     st.write("""
@@ -100,32 +136,19 @@ Instructions (again):
 3️⃣ Choose to stick with your first choice or switch to the remaining card.  
 The winning trophy card is then revealed!
 """)
-    if st.button("✅ Start Real Experiment"):
-        st.session_state.trial_mode = False
-        st.session_state.experiment_rounds = 0
-        st.session_state.ready_page = False
-        reset_game()
-        st.success(f"Real experiment started — {max_experiment_rounds} rounds to complete!")
-        st.rerun()
+    st.button("✅ Start Real Experiment", on_click=counted("start_real_experiment", start_real_experiment))
     st.stop()
 
 # --- Determine emojis for each card ---
 def get_card_emojis():
-    emojis = []
-    for i in range(3):
-        if st.session_state.phase == "reveal_all" or st.session_state.game_over:
-            emojis.append("🏆" if i == st.session_state.trophy_pos else "❌")
-        elif st.session_state.phase == "second_pick":
-            emojis.append("❌" if i == st.session_state.flipped_card else "🂠")
-        else:
-            emojis.append("🂠")
-    return emojis
+    return card_faces(N_CARDS, game.phase, game.trophy_pos,
+                      [game.flipped_card], game.game_over)
 
 # --- Show summary and hide everything else if finished ---
-if st.session_state.experiment_finished:
+if game.experiment_finished:
     st.title("🎉 Thank you for participating!")
     st.subheader("📊 Experiment Summary")
-    total_correct = st.session_state.log_df[st.session_state.log_df["phase_type"]==1]["result"].sum()
+    total_correct = game.log.sum("result", where="phase_type", equals=1)
     total_wrong = max_experiment_rounds - total_correct
     st.write(f"Correct picks: {total_correct}")
     st.write(f"Wrong picks: {total_wrong}")
@@ -133,48 +156,40 @@ if st.session_state.experiment_finished:
 
 # --- Display header depending on phase ---
 header_text = ""
-if st.session_state.phase == "first_pick":
+if game.phase == "first_pick":
     header_text = "Pick your first card"
-elif st.session_state.phase == "second_pick":
+elif game.phase == "second_pick":
     header_text = "Pick Again (same or new card)"
-elif st.session_state.phase == "reveal_all" and not st.session_state.trial_mode:
+elif game.phase == "reveal_all" and not game.trial_mode:
     header_text = "Reveal"
 
 # Add current round / total rounds for real experiment
-if not st.session_state.trial_mode:
-    current_round = st.session_state.experiment_rounds + 1
+if not game.trial_mode:
+    current_round = game.experiment_rounds + 1
     header_text = f"Round {current_round}/{max_experiment_rounds}: {header_text}"
 
-if header_text and not st.session_state.experiment_finished:
+if header_text and not game.experiment_finished:
     st.header(header_text)
 
 # --- Display cards ---
-if not st.session_state.experiment_finished and (st.session_state.experiment_rounds < max_experiment_rounds or phase_type == 0):
-    cols = st.columns(3)
-    emojis = get_card_emojis()
-    for i, col in enumerate(cols):
-        col.markdown(
-            f"<h1 style='font-size:10rem; text-align:center'>{emojis[i]}</h1>",
-            unsafe_allow_html=True
-        )
-        if not st.session_state.game_over and col.button("Pick", key=f"card_{i}", use_container_width=True):
-            if st.session_state.phase == "first_pick":
-                st.session_state.first_choice = i
-                losing_cards = [j for j in range(3) if j != i and j != st.session_state.trophy_pos]
-                st.session_state.flipped_card = random.choice(losing_cards)
-                st.session_state.phase = "second_pick"
-                st.rerun()
-            elif st.session_state.phase == "second_pick" and i != st.session_state.flipped_card:
-                st.session_state.second_choice = i
-                st.session_state.phase = "reveal_all"
-                st.session_state.game_over = True
-                st.rerun()
+if not game.experiment_finished and (game.experiment_rounds < max_experiment_rounds or phase_type == 0):
+    with stage("render_cards"):
+        cols = st.columns(N_CARDS)
+        emojis = get_card_emojis()
+        pick = counted("pick", pick_card)
+        for i, col in enumerate(cols):
+            col.markdown(
+                f"<h1 style='font-size:10rem; text-align:center'>{emojis[i]}</h1>",
+                unsafe_allow_html=True
+            )
+            if not game.game_over:
+                col.button("Pick", key=f"card_{i}", use_container_width=True, on_click=pick, args=(i,))
 
 # --- Display results and control buttons ---
-if st.session_state.game_over:
+if game.game_over:
     st.header("Result:")
-    won = st.session_state.second_choice == st.session_state.trophy_pos
-    stayed = st.session_state.first_choice == st.session_state.second_choice
+    won = game.second_choice == game.trophy_pos
+    stayed = game.first_choice == game.second_choice
 
     if won:
         if stayed:
@@ -183,65 +198,29 @@ if st.session_state.game_over:
             st.success("🎉 You won the 🏆 trophy because you switched!")
     else:
         st.error("❌ You picked the wrong card. 😢")
-        first = st.session_state.first_choice
-        trophy = st.session_state.trophy_pos
+        first = game.first_choice
+        trophy = game.trophy_pos
         if first == trophy:
             st.info("💡 You should have stayed to win.")
         else:
             st.info("💡 You should have switched to win.")
 
-    if not st.session_state.logged_this_round:
-        round_number = len(st.session_state.log_df[st.session_state.log_df["phase_type"]==phase_type]) + 1
-        new_row = pd.DataFrame([{
-            "round_number": round_number,
-            "first_choice": st.session_state.first_choice,
-            "flipped_card": st.session_state.flipped_card,
-            "second_choice": st.session_state.second_choice,
-            "trophy_card": st.session_state.trophy_pos,
-            "result": won,
-            "phase_type": phase_type
-        }])
-        st.session_state.log_df = pd.concat([st.session_state.log_df, new_row], ignore_index=True)
-        st.session_state.logged_this_round = True
-
     col1, col2 = st.columns(2)
-    if not st.session_state.trial_mode and st.session_state.experiment_rounds + 1 >= max_experiment_rounds:
+    if not game.trial_mode and game.experiment_rounds + 1 >= max_experiment_rounds:
         with col1:
-            if st.button("📊 Show Summary"):
-                try:
-                    token = st.secrets["GITHUB_TOKEN"]
-                    g = Github(token)
-                    repo = g.get_repo("joojoosch/monty-hall-card-edition")
-                    csv_data = st.session_state.log_df.to_csv(index=False)
-                    path = f"player_logs/{player_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-                    repo.create_file(path, f"Add results for {player_name}", csv_data)
-                    st.success(f"Results saved to GitHub as {path}")
-                except Exception as e:
-                    st.error(f"⚠️ Couldn't save: {e}")
-
-                st.session_state.experiment_finished = True
-                st.rerun()
+            st.button("📊 Show Summary", on_click=counted("show_summary", show_summary))
     else:
-        next_button_label = "Next Round" if not st.session_state.trial_mode else "🔄 Again"
+        next_button_label = "Next Round" if not game.trial_mode else "🔄 Again"
         with col1:
-            if st.button(next_button_label):
-                st.session_state.logged_this_round = False
-                if phase_type == 0:
-                    reset_game()
-                else:
-                    st.session_state.experiment_rounds += 1
-                    if st.session_state.experiment_rounds < max_experiment_rounds:
-                        reset_game()
-                st.rerun()
-        if st.session_state.trial_mode:
+            st.button(next_button_label, on_click=counted("next_round", next_round))
+        if game.trial_mode:
             with col2:
-                if st.button("🚀 Ready for Real Experiment"):
-                    st.session_state.ready_page = True
-                    st.rerun()
+                st.button("🚀 Ready for Real Experiment", on_click=counted("ready_for_real", ready_for_real))
 
 # --- Show game log ---
 st.divider()
 st.subheader("📊 Game Log")
-st.dataframe(st.session_state.log_df, use_container_width=True)
+with stage("render_log"):
+    st.dataframe(game.log.to_frame(), use_container_width=True)
 
 
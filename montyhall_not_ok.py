@@ -1,89 +1,45 @@
 import streamlit as st
-import random
-import pandas as pd
 from datetime import datetime
-from github import Github
-import matplotlib.pyplot as plt
-import numpy as np
+from game_engine import host_flip, card_faces
+from round_wal import finish_session, record_round
+from summary_stats import show_outcome_chart
+from game_state import ExperimentState, get_state
+from page_flow import PAGE_FLOW, PHASE_FLOW, RERUNS, counted
+from trial_schedule import enroll, schedule_for
+from profiling import stage, timed, show_admin_view
 
 st.set_page_config(page_title="Card Game Experiment", page_icon="🏆", layout="wide")
+RERUNS.script_run()
 
 # ---------------- Constants ----------------
 TRIALS_REQUIRED = 10
 TRIALS_PER_ROUND = 3  # 3 trials per round, 2 rounds => 6 experiment trials total
+N_CARDS = 3
 
-# ---------------- Session state initialization ----------------
-if "player_name" not in st.session_state:
-    st.session_state.player_name = None
-if "email" not in st.session_state:
-    st.session_state.email = ""  # optional
-
-# page values: instructions, trial, trial_summary, round1_instr, round1, round2_instr, round2, summary
-if "page" not in st.session_state:
-    st.session_state.page = "instructions"
-
-# Trials
-if "trial_runs_done" not in st.session_state:
-    st.session_state.trial_runs_done = 0
-if "trial_log" not in st.session_state:
-    st.session_state.trial_log = pd.DataFrame(columns=[
-        "trial_number", "first_choice", "flipped_card", "second_choice",
-        "trophy_card", "result", "switch_win", "stay_win", "email"
-    ])
-
-# Experiment
-if "experiment_round" not in st.session_state:
-    st.session_state.experiment_round = 0  # number of completed experiment trials (0..6)
-if "current_round_set" not in st.session_state:
-    st.session_state.current_round_set = 1  # 1 or 2
-if "experiment_log" not in st.session_state:
-    st.session_state.experiment_log = pd.DataFrame(columns=[
-        "round_number", "first_choice", "flipped_card", "second_choice",
-        "trophy_card", "result", "phase_type", "points_after_round",
-        "switch_win", "stay_win", "email"
-    ])
-
-# Game state
-if "cards" not in st.session_state:
-    st.session_state.cards = ["🂠"] * 3
-if "trophy_pos" not in st.session_state:
-    st.session_state.trophy_pos = random.randint(0, 2)
-if "first_choice" not in st.session_state:
-    st.session_state.first_choice = None
-if "flipped_card" not in st.session_state:
-    st.session_state.flipped_card = None
-if "second_choice" not in st.session_state:
-    st.session_state.second_choice = None
-if "phase" not in st.session_state:
-    st.session_state.phase = "first_pick"  # first_pick, second_pick, reveal_all
-if "game_over" not in st.session_state:
-    st.session_state.game_over = False
-if "points" not in st.session_state:
-    st.session_state.points = 50  # start points when real experiment begins
-if "logged_this_round" not in st.session_state:
-    st.session_state.logged_this_round = False
+# ---------------- Session state (one object, created on the first run) ----------------
+with stage("state_init"):
+    game = get_state(ExperimentState, n_cards=N_CARDS)
+show_admin_view()
 
 # ---------------- Helpers ----------------
 def reset_game_state_for_trial():
-    st.session_state.cards = ["🂠"] * 3
-    st.session_state.trophy_pos = random.randint(0, 2)
-    st.session_state.first_choice = None
-    st.session_state.flipped_card = None
-    st.session_state.second_choice = None
-    st.session_state.phase = "first_pick"
-    st.session_state.game_over = False
-    st.session_state.logged_this_round = False
+    # Next round's layout comes from the session's pre-generated schedule
+    if game.slot is None and game.page in ("round1", "round2", "trial"):
+        game.slot = enroll()
+    if game.page in ("round1", "round2"):
+        layout = schedule_for(game.slot, "experiment", N_CARDS).layout(game.experiment_round)
+    elif game.page == "trial":
+        layout = schedule_for(game.slot, "trial", N_CARDS).layout(game.trials_played)
+    else:
+        layout = None
+    game.reset_round(layout)
+
+def go(event):
+    game.page = PAGE_FLOW.next(game.page, event)
 
 def card_emojis():
-    em = []
-    for i in range(3):
-        if st.session_state.phase == "reveal_all" or st.session_state.game_over:
-            em.append("🏆" if i == st.session_state.trophy_pos else "❌")
-        elif st.session_state.phase == "second_pick":
-            em.append("❌" if i == st.session_state.flipped_card else "🂠")
-        else:
-            em.append("🂠")
-    return em
+    return card_faces(N_CARDS, game.phase, game.trophy_pos,
+                      [game.flipped_card], game.game_over)
 
 def compute_switch_stay(first, second, trophy):
     if second == trophy:
@@ -93,17 +49,130 @@ def compute_switch_stay(first, second, trophy):
             return 1, 0
     return 0, 0
 
+def action_cost(staying):
+    # Round 1: switching costs 10. Round 2: staying costs 10. Trials are free.
+    if game.page == "trial":
+        return 0
+    if game.current_round_set == 1 and not staying:
+        return 10
+    if game.current_round_set == 2 and staying:
+        return 10
+    return 0
+
 def current_trial_index_in_set():
     # experiment_round counts completed trials (0..6). For display, we want 1..3 within current round set.
-    completed = st.session_state.experiment_round
+    # The round on screen is already counted once it has been revealed.
+    completed = game.experiment_round - (1 if game.game_over else 0)
     idx = (completed % TRIALS_PER_ROUND) + 1
     return idx
 
-# ---------------- Page 1: Instructions + Name + optional email ----------------
-if st.session_state.page == "instructions":
-    # ensure clean state
+# ---------------- Callbacks (run before the script, so no st.rerun needed) ----------------
+def confirm_name():
+    name_input = st.session_state.name_input
+    if name_input.strip() == "":
+        st.warning("Please enter a valid name.")
+        return
+    game.player_name = name_input.strip()
+    game.email = st.session_state.email_input.strip()
+    # proceed to trials
+    go("confirm_name")
+    reset_game_state_for_trial()
+
+@timed("log_round")
+def log_round():
+    first = game.first_choice
+    second = game.second_choice
+    trophy = game.trophy_pos
+    won = (second == trophy)
+    switch_win, stay_win = compute_switch_stay(first, second, trophy)
+    if game.page == "trial":
+        game.trial_log.append(
+            trial_number=game.trial_runs_done + 1,
+            first_choice=first,
+            flipped_card=game.flipped_card,
+            second_choice=second,
+            trophy_card=trophy,
+            result=won,
+            switch_win=switch_win,
+            stay_win=stay_win,
+            email=game.email,
+            schedule_key=game.slot
+        )
+        game.trial_outcomes.record(first, second, won)
+        game.trial_runs_done += 1
+        game.trials_played += 1
+    else:
+        if won:
+            game.points += 100
+        record_round(
+            game.log_id, game.player_name, game.experiment_log,
+            round_number=game.experiment_round + 1,
+            first_choice=first,
+            flipped_card=game.flipped_card,
+            second_choice=second,
+            trophy_card=trophy,
+            result=won,
+            phase_type=game.current_round_set,
+            points_after_round=game.points,
+            switch_win=switch_win,
+            stay_win=stay_win,
+            email=game.email,
+            schedule_key=game.slot
+        )
+        game.experiment_outcomes.record(first, second, won)
+        game.experiment_round += 1
+
+def pick_card(i):
+    if game.phase == "first_pick":
+        game.first_choice = i
+        game.flipped_card = host_flip(i, game.trophy_pos, N_CARDS, tie_break=game.tie_break)
+        game.phase = PHASE_FLOW.next(game.phase, "pick")
+    elif game.phase == "second_pick" and i != game.flipped_card:
+        cost = action_cost(i == game.first_choice)
+        if game.points < cost:
+            st.warning("⚠️ You don’t have enough points for this action!")
+            return
+        game.points -= cost
+        game.second_choice = i
+        game.phase = PHASE_FLOW.next(game.phase, "pick")
+        game.game_over = True
+        # log the finished round once, right here
+        log_round()
+
+def trial_next():
+    reset_game_state_for_trial()
+
+def see_trial_results():
+    go("see_results")
+
+def more_trials():
+    game.trial_runs_done = 0
+    game.trial_log.clear()
+    game.trial_outcomes.reset()
+    go("more_trials")
     reset_game_state_for_trial()
 
+def start_experiment():
+    go("start_experiment")
+    reset_game_state_for_trial()  # ensure no stray results
+
+def start_round(round_set):
+    if round_set == 1:
+        game.points = 50
+        game.experiment_round = 0
+    game.current_round_set = round_set
+    go("start_round")
+    reset_game_state_for_trial()
+
+def experiment_next():
+    # If finished Round1 (3 trials) move to round2 instructions,
+    # if finished Round2 (6 trials total) -> final summary
+    if game.experiment_round >= TRIALS_PER_ROUND * game.current_round_set:
+        go("round_set_done")
+    reset_game_state_for_trial()
+
+# ---------------- Page 1: Instructions + Name + optional email ----------------
+if game.page == "instructions":
     st.title("🏆 Card Game Experiment")
     st.write("""
 You will be shown three cards and your goal is to find the trophy 🏆 behind one of them.
@@ -114,108 +183,73 @@ You will be shown three cards and your goal is to find the trophy 🏆 behind on
 The winning trophy card is then revealed!
 """)
 
-    name_input = st.text_input("Enter your first and last name:", value=st.session_state.player_name or "")
-    email_input = st.text_input("(Optional) Enter your email to be eligible for a prize if you're a top scorer:", value=st.session_state.email or "")
+    st.text_input("Enter your first and last name:", value=game.player_name or "", key="name_input")
+    st.text_input("(Optional) Enter your email to be eligible for a prize if you're a top scorer:", value=game.email or "", key="email_input")
 
-    if st.button("✅ Confirm Name and Continue"):
-        if name_input.strip() == "":
-            st.warning("Please enter a valid name.")
-        else:
-            st.session_state.player_name = name_input.strip()
-            st.session_state.email = email_input.strip()
-            # proceed to trials
-            st.session_state.page = "trial"
-            reset_game_state_for_trial()
-            st.rerun()
+    st.button("✅ Confirm Name and Continue", on_click=counted("confirm_name", confirm_name))
     st.stop()
 
 # ---------------- Page 2: Trial Runs (Practice) ----------------
-if st.session_state.page == "trial":
+if game.page == "trial":
     st.title("🔁 Trial Runs (Practice)")
     # Determine display trial number (1..TRIALS_REQUIRED). If all done, show TRIALS_REQUIRED.
-    if st.session_state.trial_runs_done >= TRIALS_REQUIRED:
+    if game.trial_runs_done >= TRIALS_REQUIRED:
         trial_display = TRIALS_REQUIRED
     else:
         # If we're mid-trial (game_over False) we show next trial index = done + 1
-        trial_display = st.session_state.trial_runs_done + (0 if st.session_state.game_over else 1)
+        trial_display = game.trial_runs_done + (0 if game.game_over else 1)
         if trial_display > TRIALS_REQUIRED:
             trial_display = TRIALS_REQUIRED
     st.write(f"Trial {trial_display}/{TRIALS_REQUIRED}")
 
     # Top Next / See Results button appears only after reveal (game_over True)
-    if st.session_state.game_over:
+    if game.game_over:
         col_top, _ = st.columns([1, 4])
         with col_top:
-            if st.session_state.trial_runs_done < TRIALS_REQUIRED:
-                if st.button("Next", key="trial_next_top"):
-                    reset_game_state_for_trial()
-                    st.rerun()
+            if game.trial_runs_done < TRIALS_REQUIRED:
+                st.button("Next", key="trial_next_top", on_click=counted("trial_next", trial_next))
             else:
                 # After finishing the 10th trial (trial_runs_done == TRIALS_REQUIRED), offer See Results
-                if st.button("📄 See Results", key="trial_see_results_top"):
-                    st.session_state.page = "trial_summary"
-                    st.rerun()
+                st.button("📄 See Results", key="trial_see_results_top",
+                          on_click=counted("see_results", see_trial_results))
 
     # Phase header below top button
-    if st.session_state.phase == "first_pick":
+    if game.phase == "first_pick":
         st.subheader("Pick your first card")
-    elif st.session_state.phase == "second_pick":
+    elif game.phase == "second_pick":
         st.subheader("Pick Again (same or switch)")
 
 # ---------------- Card display & logic (Trials & Experiment) ----------------
-if st.session_state.page in ["trial", "round1", "round2"]:
+if game.page in ["trial", "round1", "round2"]:
     # For real experiment pages, show header & points above cards
-    if st.session_state.page == "round1":
-        idx = ((st.session_state.experiment_round) % TRIALS_PER_ROUND) + 1
+    if game.page == "round1":
+        idx = current_trial_index_in_set()
         st.title(f"Round 1 — Trial {idx}/{TRIALS_PER_ROUND}")
-        st.markdown(f"### 💰 Current Score: {st.session_state.points} points")
-    elif st.session_state.page == "round2":
-        idx = ((st.session_state.experiment_round) % TRIALS_PER_ROUND) + 1
+        st.markdown(f"### 💰 Current Score: {game.points} points")
+    elif game.page == "round2":
+        idx = current_trial_index_in_set()
         st.title(f"Round 2 — Trial {idx}/{TRIALS_PER_ROUND}")
-        st.markdown(f"### 💰 Current Score: {st.session_state.points} points")
-
-    cols = st.columns(3)
-    emojis = card_emojis()
-    for i, col in enumerate(cols):
-        col.markdown(f"<h1 style='font-size:10rem; text-align:center'>{emojis[i]}</h1>", unsafe_allow_html=True)
-        if not st.session_state.game_over and col.button("Pick", key=f"card_{i}", use_container_width=True):
-            if st.session_state.phase == "first_pick":
-                st.session_state.first_choice = i
-                losing_cards = [j for j in range(3) if j != i and j != st.session_state.trophy_pos]
-                st.session_state.flipped_card = random.choice(losing_cards)
-                st.session_state.phase = "second_pick"
-                st.rerun()
-
-            elif st.session_state.phase == "second_pick" and i != st.session_state.flipped_card:
-                staying = (i == st.session_state.first_choice)
-                cost = 0
-                # apply cost only in real experiment
-                if st.session_state.page != "trial":
-                    if st.session_state.current_round_set == 1 and not staying:
-                        cost = 10
-                    elif st.session_state.current_round_set == 2 and staying:
-                        cost = 10
-                    if st.session_state.points < cost:
-                        st.warning("⚠️ You don’t have enough points for this action!")
-                        st.stop()
-                    st.session_state.points -= cost
-
-                st.session_state.second_choice = i
-                st.session_state.phase = "reveal_all"
-                st.session_state.game_over = True
-                st.rerun()
+        st.markdown(f"### 💰 Current Score: {game.points} points")
+
+    with stage("render_cards"):
+        cols = st.columns(N_CARDS)
+        emojis = card_emojis()
+        pick = counted("pick", pick_card)
+        for i, col in enumerate(cols):
+            col.markdown(f"<h1 style='font-size:10rem; text-align:center'>{emojis[i]}</h1>", unsafe_allow_html=True)
+            if not game.game_over:
+                col.button("Pick", key=f"card_{i}", use_container_width=True, on_click=pick, args=(i,))
 
 # ---------------- Display results area (below cards) ----------------
-if st.session_state.game_over:
-    first = st.session_state.first_choice
-    second = st.session_state.second_choice
-    trophy = st.session_state.trophy_pos
+if game.game_over:
+    first = game.first_choice
+    second = game.second_choice
+    trophy = game.trophy_pos
     won = (second == trophy)
     stayed = (first == second)
-    switch_win, stay_win = compute_switch_stay(first, second, trophy)
 
     # TRIAL behavior (advice only on loss)
-    if st.session_state.page == "trial":
+    if game.page == "trial":
         if won:
             st.success("🎉 You found the correct card!")
         else:
@@ -225,138 +259,41 @@ if st.session_state.game_over:
             elif first != trophy and second != trophy:
                 st.info("💡 You should have switched to win.")
 
-        if not st.session_state.logged_this_round:
-            trial_number = st.session_state.trial_runs_done + 1
-            new_row = pd.DataFrame([{
-                "trial_number": trial_number,
-                "first_choice": first,
-                "flipped_card": st.session_state.flipped_card,
-                "second_choice": second,
-                "trophy_card": trophy,
-                "result": won,
-                "switch_win": switch_win,
-                "stay_win": stay_win,
-                "email": st.session_state.email
-            }])
-            st.session_state.trial_log = pd.concat([st.session_state.trial_log, new_row], ignore_index=True)
-            st.session_state.trial_runs_done += 1
-            st.session_state.logged_this_round = True
-
-    # REAL experiment behavior
+    # REAL experiment behavior (the round was logged by the pick callback)
     else:
         # bonus and lost points for display
         bonus = 100 if won else 0
-        if st.session_state.current_round_set == 1:
-            lost_points = 10 if (not stayed) else 0
-        else:
-            lost_points = 10 if stayed else 0
-
-        if not st.session_state.logged_this_round:
-            st.session_state.points += bonus
-
+        lost_points = action_cost(stayed)
         st.markdown(f"**You won +{bonus} points and lost −{lost_points} points this round.**")
 
-        # log experiment trial once
-        if not st.session_state.logged_this_round:
-            round_number = st.session_state.experiment_round + 1
-            new_row = pd.DataFrame([{
-                "round_number": round_number,
-                "first_choice": first,
-                "flipped_card": st.session_state.flipped_card,
-                "second_choice": second,
-                "trophy_card": trophy,
-                "result": won,
-                "phase_type": st.session_state.current_round_set,
-                "points_after_round": st.session_state.points,
-                "switch_win": switch_win,
-                "stay_win": stay_win,
-                "email": st.session_state.email
-            }])
-            st.session_state.experiment_log = pd.concat([st.session_state.experiment_log, new_row], ignore_index=True)
-            st.session_state.experiment_round += 1
-            st.session_state.logged_this_round = True
-
     # TOP Next button for experiment pages (visual top placement is handled when page rendered; this ensures navigation)
-    if st.session_state.page in ["round1", "round2"]:
+    if game.page in ["round1", "round2"]:
         col_top, _ = st.columns([1, 4])
         with col_top:
-            if st.button("Next", key=f"exp_next_top_{st.session_state.page}"):
-                # If finished Round1 (3 trials) move to round2 instructions
-                if st.session_state.current_round_set == 1 and st.session_state.experiment_round >= TRIALS_PER_ROUND:
-                    st.session_state.page = "round2_instr"
-                    reset_game_state_for_trial()
-                    st.rerun()
-                # If finished Round2 (6 trials total) -> final summary
-                elif st.session_state.current_round_set == 2 and st.session_state.experiment_round >= (TRIALS_PER_ROUND * 2):
-                    st.session_state.page = "summary"
-                    st.rerun()
-                else:
-                    reset_game_state_for_trial()
-                    st.rerun()
+            st.button("Next", key=f"exp_next_top_{game.page}",
+                      on_click=counted("experiment_next", experiment_next))
 
 # ---------------- Trial Summary Page (with Matplotlib chart) ----------------
-if st.session_state.page == "trial_summary":
+if game.page == "trial_summary":
     st.title("📄 Trial Summary")
-    st.write(f"Trials completed: **{st.session_state.trial_runs_done}**")
-    total_switch_wins = int(st.session_state.trial_log['switch_win'].sum())
-    total_stay_wins = int(st.session_state.trial_log['stay_win'].sum())
-    total_wins = int(st.session_state.trial_log['result'].sum())
-    total_switch_attempts = int((st.session_state.trial_log['switch_win'] + (st.session_state.trial_log['result'] == False) * (st.session_state.trial_log['switch_win'] == 0)).sum())  # fallback, but we'll compute robustly below
-
-    st.write(f"Wins by switching: **{total_switch_wins}**")
-    st.write(f"Wins by staying: **{total_stay_wins}**")
-    st.write(f"Total wins: **{total_wins}**")
-
-    # Build counts for plotting: For trials, compute switch attempts and stay attempts and wins/losses
-    # We'll compute directly:
-    df = st.session_state.trial_log.copy()
-    # Determine for each trial whether it was a switch or stay action
-    def was_switch(row):
-        return row['first_choice'] != row['second_choice']
-    df['action'] = df.apply(was_switch, axis=1)  # True = switch, False = stay
-    # Now aggregate
-    switch_df = df[df['action'] == True]
-    stay_df = df[df['action'] == False]
-    switch_wins = int(switch_df['result'].sum())
-    switch_losses = int(len(switch_df) - switch_wins)
-    stay_wins = int(stay_df['result'].sum())
-    stay_losses = int(len(stay_df) - stay_wins)
-
-    # Matplotlib grouped bar chart
-    labels = ['Switch', 'Stay']
-    wins = [switch_wins, stay_wins]
-    losses = [switch_losses, stay_losses]
-
-    x = np.arange(len(labels))
-    width = 0.35
-
-    fig, ax = plt.subplots()
-    ax.bar(x - width/2, wins, width, label='Wins')
-    ax.bar(x + width/2, losses, width, label='Losses')
-    ax.set_ylabel('Count')
-    ax.set_title('Trial outcomes by action (Switch vs Stay)')
-    ax.set_xticks(x)
-    ax.set_xticklabels(labels)
-    ax.legend()
-    st.pyplot(fig)
+    st.write(f"Trials completed: **{game.trial_runs_done}**")
+    outcomes = game.trial_outcomes
+    st.write(f"Wins by switching: **{outcomes.switch_wins}**")
+    st.write(f"Wins by staying: **{outcomes.stay_wins}**")
+    st.write(f"Total wins: **{outcomes.wins}**")
+
+    # Counters are kept up to date as trials are logged; the chart is cached by them
+    show_outcome_chart(outcomes, 'Trial outcomes by action (Switch vs Stay)')
 
     st.write("You may choose to repeat another 10 trial rounds or proceed to the real experiment.")
     col1, col2 = st.columns(2)
     with col1:
-        if st.button("🔄 Another 10 Trial Rounds"):
-            st.session_state.trial_runs_done = 0
-            st.session_state.trial_log = pd.DataFrame(columns=st.session_state.trial_log.columns)
-            st.session_state.page = "trial"
-            reset_game_state_for_trial()
-            st.rerun()
+        st.button("🔄 Another 10 Trial Rounds", on_click=counted("more_trials", more_trials))
     with col2:
-        if st.button("🚀 Go to Real Experiment"):
-            st.session_state.page = "round1_instr"
-            st.rerun()
+        st.button("🚀 Go to Real Experiment", on_click=counted("start_experiment", start_experiment))
 
 # ---------------- Round 1 Instructions (clean, no Next) ----------------
-if st.session_state.page == "round1_instr":
-    reset_game_state_for_trial()  # ensure no stray results
+if game.page == "round1_instr":
     st.title("🎯 Round 1 Instructions")
     st.write("""
 Now we add the point system for the real experiment.
@@ -366,19 +303,12 @@ Now we add the point system for the real experiment.
 - **Switching** after the reveal costs **10 points** in Round 1.
 - Staying is free in Round 1.
 """)
-    if st.button("✅ I understand, start Round 1"):
-        st.session_state.points = 50
-        st.session_state.current_round_set = 1
-        st.session_state.experiment_round = 0
-        st.session_state.page = "round1"
-        reset_game_state_for_trial()
-        st.rerun()
+    st.button("✅ I understand, start Round 1", on_click=counted("start_round", start_round), args=(1,))
 
 # ---------------- Round 1 page is handled in the card display block above ----------------
 
 # ---------------- Round 2 Instructions (already clean) ----------------
-if st.session_state.page == "round2_instr":
-    reset_game_state_for_trial()
+if game.page == "round2_instr":
     st.title("🎯 Round 2 Instructions")
     st.write("""
 Round 2 rules:
@@ -387,64 +317,31 @@ Round 2 rules:
 - **Staying** with your first choice now costs **10 points**.
 - Switching is free.
 """)
-    if st.button("✅ I understand, start Round 2"):
-        st.session_state.current_round_set = 2
-        st.session_state.page = "round2"
-        reset_game_state_for_trial()
-        st.rerun()
+    st.button("✅ I understand, start Round 2", on_click=counted("start_round", start_round), args=(2,))
 
 # ---------------- Final Summary (no DataFrame shown to participant, Matplotlib chart + GitHub upload) ----------------
-if st.session_state.page == "summary":
+if game.page == "summary":
     st.title("🎉 Experiment Complete!")
-    st.markdown(f"### 💰 Final points: {st.session_state.points} points")
-    total_correct = int(st.session_state.experiment_log['result'].sum())
-    st.write(f"✅ Total correct picks: **{total_correct}**")
-    total_switch_wins = int(st.session_state.experiment_log['switch_win'].sum())
-    total_stay_wins = int(st.session_state.experiment_log['stay_win'].sum())
-    st.write(f"Wins by switching: **{total_switch_wins}**")
-    st.write(f"Wins by staying: **{total_stay_wins}**")
-
-    # Build counts for plotting from experiment_log
-    df_exp = st.session_state.experiment_log.copy()
-    if len(df_exp) > 0:
-        def was_switch(row):
-            return row['first_choice'] != row['second_choice']
-        df_exp['action'] = df_exp.apply(was_switch, axis=1)
-        switch_df = df_exp[df_exp['action'] == True]
-        stay_df = df_exp[df_exp['action'] == False]
-        switch_wins = int(switch_df['result'].sum())
-        switch_losses = int(len(switch_df) - switch_wins)
-        stay_wins = int(stay_df['result'].sum())
-        stay_losses = int(len(stay_df) - stay_wins)
-
-        labels = ['Switch', 'Stay']
-        wins = [switch_wins, stay_wins]
-        losses = [switch_losses, stay_losses]
-
-        x = np.arange(len(labels))
-        width = 0.35
-        fig, ax = plt.subplots()
-        ax.bar(x - width/2, wins, width, label='Wins')
-        ax.bar(x + width/2, losses, width, label='Losses')
-        ax.set_ylabel('Count')
-        ax.set_title('Experiment outcomes by action (Switch vs Stay)')
-        ax.set_xticks(x)
-        ax.set_xticklabels(labels)
-        ax.legend()
-        st.pyplot(fig)
+    st.markdown(f"### 💰 Final points: {game.points} points")
+    outcomes = game.experiment_outcomes
+    st.write(f"✅ Total correct picks: **{outcomes.wins}**")
+    st.write(f"Wins by switching: **{outcomes.switch_wins}**")
+    st.write(f"Wins by staying: **{outcomes.stay_wins}**")
+
+    if outcomes.total > 0:
+        show_outcome_chart(outcomes, 'Experiment outcomes by action (Switch vs Stay)')
     else:
         st.info("No experiment trials logged yet.")
 
-    # Upload to GitHub (include email column in CSV)
-    try:
-        token = st.secrets["GITHUB_TOKEN"]
-        g = Github(token)
-        repo = g.get_repo("joojoosch/monty-hall-card-edition")
-        csv_data = st.session_state.experiment_log.to_csv(index=False)
-        path = f"player_logs/{st.session_state.player_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-        repo.create_file(path, f"Add results for {st.session_state.player_name}", csv_data)
-        st.success(f"Results saved to GitHub as {path}")
-    except Exception as e:
-        st.error(f"⚠️ Couldn't save to GitHub: {e}")
-
-   
+    # Upload to GitHub (include email column in CSV). The rounds are already in
+    # the WAL; closing the session lets the compactor write the file and queue
+    # it for the background writer, which batches participants into one commit.
+    # Closed once, not again on later reruns of this page.
+    if not game.results_saved:
+        try:
+            with stage("persist"):
+                path = finish_session(game.log_id, game.player_name, game.experiment_log, datetime.now())
+            game.results_saved = True
+            st.success(f"Results queued for saving to GitHub as {path}")
+        except Exception as e:
+            st.error(f"⚠️ Couldn't save to GitHub: {e}")
@@ -0,0 +1,102 @@
+# page_flow.py
+# Declarative page and phase transitions for the apps. Buttons fire events
+# from on_click callbacks, which run before the script, so a click costs one
+# script run instead of a run plus an st.rerun(). RERUNS counts script runs
+# and actions per process to confirm that.
+import threading
+
+
+class InvalidTransition(ValueError):
+    pass
+
+
+class StateMachine:
+    def __init__(self, transitions):
+        # transitions: {(state, event): next_state}
+        self.transitions = dict(transitions)
+        self.states = {s for s, _ in self.transitions} | set(self.transitions.values())
+
+    def next(self, state, event):
+        try:
+            return self.transitions[(state, event)]
+        except KeyError:
+            raise InvalidTransition(f"No transition for {event!r} from {state!r}") from None
+
+    def events(self, state):
+        return [e for s, e in self.transitions if s == state]
+
+
+# montyhall_not_ok.py pages
+PAGE_FLOW = StateMachine({
+    ("instructions", "confirm_name"): "trial",
+    ("trial", "see_results"): "trial_summary",
+    ("trial_summary", "more_trials"): "trial",
+    ("trial_summary", "start_experiment"): "round1_instr",
+    ("round1_instr", "start_round"): "round1",
+    ("round1", "round_set_done"): "round2_instr",
+    ("round2_instr", "start_round"): "round2",
+    ("round2", "round_set_done"): "summary",
+})
+
+# Phases of one card game (both apps)
+PHASE_FLOW = StateMachine({
+    ("first_pick", "pick"): "second_pick",
+    ("second_pick", "pick"): "reveal_all",
+    ("reveal_all", "next_round"): "first_pick",
+})
+
+
+class RerunCounter:
+    # Script runs vs user actions for this server process
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.actions = 0
+        self.by_action = {}
+
+    def script_run(self):
+        with self._lock:
+            self.runs += 1
+
+    def action(self, name):
+        with self._lock:
+            self.actions += 1
+            self.by_action[name] = self.by_action.get(name, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "runs": self.runs,
+                "actions": self.actions,
+                "runs_per_action": self.runs / self.actions if self.actions else float("nan"),
+                "by_action": dict(self.by_action),
+            }
+
+    def reset(self):
+        with self._lock:
+            self.runs = 0
+            self.actions = 0
+            self.by_action = {}
+
+
+RERUNS = RerunCounter()
+
+# Run after every counted action, e.g. to save the session to a shared store
+_after_action = []
+
+
+def after_action(hook):
+    if hook not in _after_action:
+        _after_action.append(hook)
+
+
+def counted(name, callback):
+    # Wrap an on_click callback so every click is counted as one action
+    def run(*args, **kwargs):
+        RERUNS.action(name)
+        try:
+            return callback(*args, **kwargs)
+        finally:
+            for hook in _after_action:
+                hook()
+    return run
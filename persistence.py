@@ -0,0 +1,477 @@
+# persistence.py
+# Result persistence with pluggable backends. The apps hand finished CSVs to
+# a ResultWriter, which returns at once and writes from a background thread:
+# queued files are batched into a single commit/flush and retried with
+# exponential backoff. One writer and one storage client are shared by every
+# session in the server process (st.cache_resource). An UploadIndex of content
+# hashes and session ids drops repeated uploads before anything is written.
+import atexit
+import hashlib
+import logging
+import os
+import posixpath
+import queue
+import threading
+import time
+
+import streamlit as st
+
+from profiling import stage
+
+REPO_NAME = "joojoosch/monty-hall-card-edition"
+LOG_DIR = "player_logs"
+
+logger = logging.getLogger(__name__)
+
+
+# --- Backends ---
+# A backend needs write_batch(files, message), where files is a list of
+# (path, content) pairs, and ping() -> bool as a health check. write_batch
+# either stores all of the files or raises. list_files(directory) and
+# read_file(path) let readers such as the dashboard fetch stored results, and
+# file_hashes(directory) -> {path: content_hash} lets them spot changed files
+# without reading them;
+# delete_batch(paths, message) is only used by the dedup_logs.py tool.
+HEALTH_TTL = 60.0  # seconds a successful health check is trusted
+
+
+class GithubBackend:
+    def __init__(self, token, repo_name=REPO_NAME, branch="main", pool_size=10):
+        self.token = token
+        self.repo_name = repo_name
+        self.branch = branch
+        self.pool_size = pool_size
+        self._repo = None
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+
+    def repo(self):
+        # Created on first use and reused afterwards, so the TLS connection
+        # pool and the repo lookup are paid once per process
+        with self._lock:
+            if self._repo is None:
+                from github import Auth, Github
+
+                client = Github(auth=Auth.Token(self.token), pool_size=self.pool_size)
+                self._repo = client.get_repo(self.repo_name)
+            return self._repo
+
+    def ping(self):
+        if time.monotonic() - self._checked_at < HEALTH_TTL:
+            return True
+        try:
+            self.repo().get_git_ref(f"heads/{self.branch}")
+        except Exception as e:
+            logger.warning("GitHub health check failed: %s", e)
+            with self._lock:
+                self._repo = None  # reconnect on next use
+            return False
+        self._checked_at = time.monotonic()
+        return True
+
+    def write_batch(self, files, message):
+        from github import InputGitTreeElement
+
+        repo = self.repo()
+        # One commit for the whole batch through the git data API
+        ref = repo.get_git_ref(f"heads/{self.branch}")
+        base = repo.get_git_commit(ref.object.sha)
+        elements = [InputGitTreeElement(path, "100644", "blob", content=content)
+                    for path, content in files]
+        tree = repo.create_git_tree(elements, base.tree)
+        commit = repo.create_git_commit(message, tree, [base])
+        ref.edit(commit.sha)
+
+    def delete_batch(self, paths, message):
+        from github import InputGitTreeElement
+
+        repo = self.repo()
+        ref = repo.get_git_ref(f"heads/{self.branch}")
+        base = repo.get_git_commit(ref.object.sha)
+        # A tree entry with sha=None removes the path
+        elements = [InputGitTreeElement(path, "100644", "blob", sha=None) for path in paths]
+        tree = repo.create_git_tree(elements, base.tree)
+        commit = repo.create_git_commit(message, tree, [base])
+        ref.edit(commit.sha)
+
+    def _tree(self, directory):
+        # path -> blob sha of the files directly in `directory`, from one
+        # recursive tree listing (get_contents stops at 1,000 entries)
+        repo = self.repo()
+        ref = repo.get_git_ref(f"heads/{self.branch}")
+        tree = repo.get_git_tree(ref.object.sha, recursive=True)
+        if tree.truncated:
+            logger.warning("GitHub tree listing of %s was truncated", self.repo_name)
+        prefix = directory.rstrip("/") + "/"
+        return {item.path: item.sha for item in tree.tree
+                if item.type == "blob" and item.path.startswith(prefix)
+                and "/" not in item.path[len(prefix):]}
+
+    def list_files(self, directory=LOG_DIR):
+        return list(self._tree(directory))
+
+    def file_hashes(self, directory=LOG_DIR):
+        # Blob shas are content_hash values, so nothing has to be downloaded
+        return self._tree(directory)
+
+    def read_file(self, path):
+        return self.repo().get_contents(path, ref=self.branch).decoded_content.decode("utf-8")
+
+
+class LocalBackend:
+    # Writes into a local directory; stand-in for GitHub during development and tests
+    def __init__(self, root="."):
+        self.root = root
+        self._hashes = {}  # path -> ((size, mtime_ns), hash), so unchanged files are not reread
+
+    def write_batch(self, files, message):
+        for path, content in files:
+            full = os.path.join(self.root, path)
+            os.makedirs(os.path.dirname(full) or ".", exist_ok=True)
+            tmp = full + ".tmp"
+            with open(tmp, "w", encoding="utf-8", newline="") as f:
+                f.write(content)
+            os.replace(tmp, full)
+
+    def delete_batch(self, paths, message):
+        for path in paths:
+            os.remove(os.path.join(self.root, path))
+
+    def list_files(self, directory=LOG_DIR):
+        full = os.path.join(self.root, directory)
+        if not os.path.isdir(full):
+            return []
+        return [f"{directory}/{entry.name}" for entry in os.scandir(full)
+                if entry.is_file() and not entry.name.endswith(".tmp")]
+
+    def read_file(self, path):
+        with open(os.path.join(self.root, path), encoding="utf-8", newline="") as f:
+            return f.read()
+
+    def file_hashes(self, directory=LOG_DIR):
+        hashes = {}
+        for path in self.list_files(directory):
+            info = os.stat(os.path.join(self.root, path))
+            stamp = (info.st_size, info.st_mtime_ns)
+            cached = self._hashes.get(path)
+            if cached is None or cached[0] != stamp:
+                cached = self._hashes[path] = (stamp, content_hash(self.read_file(path)))
+            hashes[path] = cached[1]
+        return hashes
+
+    def ping(self):
+        os.makedirs(self.root, exist_ok=True)
+        return os.access(self.root, os.W_OK)
+
+
+class FakeBackend:
+    # In-memory backend with optional simulated latency and failures, for
+    # load-testing the upload path offline
+    def __init__(self, latency=0.0, fail_every=0):
+        self.latency = latency
+        self.fail_every = fail_every
+        self.files = {}
+        self.commits = 0
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def write_batch(self, files, message):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+            if self.fail_every and self.calls % self.fail_every == 0:
+                raise RuntimeError("simulated storage failure")
+            self.files.update(files)
+            self.commits += 1
+
+    def delete_batch(self, paths, message):
+        with self._lock:
+            for path in paths:
+                del self.files[path]
+            self.commits += 1
+
+    def list_files(self, directory=LOG_DIR):
+        with self._lock:
+            return [path for path in self.files if path.startswith(directory + "/")]
+
+    def read_file(self, path):
+        with self._lock:
+            return self.files[path]
+
+    def file_hashes(self, directory=LOG_DIR):
+        with self._lock:
+            return {path: content_hash(content) for path, content in self.files.items()
+                    if path.startswith(directory + "/")}
+
+    def ping(self):
+        return True
+
+
+def make_backend(secrets=None):
+    # MONTYHALL_STORAGE=local writes under MONTYHALL_LOCAL_DIR instead of
+    # GitHub; MONTYHALL_STORAGE=fake keeps everything in memory
+    kind = os.environ.get("MONTYHALL_STORAGE", "github")
+    if kind == "local":
+        return LocalBackend(os.environ.get("MONTYHALL_LOCAL_DIR", "local_store"))
+    if kind == "fake":
+        return FakeBackend(latency=float(os.environ.get("MONTYHALL_FAKE_LATENCY", "0")))
+    if kind != "github":
+        raise ValueError(f"Unknown MONTYHALL_STORAGE: {kind}")
+    return GithubBackend(secrets["GITHUB_TOKEN"])
+
+
+def log_path(player_name, when):
+    return f"{LOG_DIR}/{player_name}_{when.strftime('%Y%m%d_%H%M%S')}.csv"
+
+
+def log_player(path):
+    # Inverse of log_path for the participant name; "" for other file names
+    stem = posixpath.basename(path).rsplit(".", 1)[0]
+    parts = stem.rsplit("_", 2)
+    return parts[0] if len(parts) == 3 else ""
+
+
+# --- Upload index ---
+def content_hash(content):
+    # Git's blob sha1, so hashes from a GitHub tree listing compare directly
+    data = content.encode("utf-8")
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+class UploadIndex:
+    # Content hash and session id of every file queued in this process, plus
+    # the content hashes of the files that were in storage when it was
+    # seeded. A file with the same participant and content as one of those is
+    # a duplicate; a new snapshot of a session that was already uploaded goes
+    # to that session's first path, so it replaces the file instead of adding
+    # another one.
+    # Detection is per process: files that other workers upload after the
+    # seed, and session ids seen by other workers, are not known here.
+    # dedup_logs.py cleans up whatever slips through.
+    # stored() tells whether a content is known to be in storage (seeded, or
+    # written by a writer of this process), not merely queued.
+    def __init__(self):
+        self._by_content = {}  # (player_name, hash) -> path
+        self._by_session = {}  # session id -> path
+        self._stored = set()  # (player_name, hash) confirmed in storage
+        self._lock = threading.Lock()
+        self._seeded = False
+
+    def claim(self, path, content, player_name="", session_id=None):
+        # -> (path to write, False if this exact file is already stored or queued)
+        key = (player_name, content_hash(content))
+        with self._lock:
+            if key in self._by_content:
+                return self._by_content[key], False
+            if session_id is not None:
+                path = self._by_session.setdefault(session_id, path)
+            self._by_content[key] = path
+            return path, True
+
+    def seed(self, backend, directory=LOG_DIR):
+        # Record the files already in storage, once per process; the hashes
+        # come from backend.file_hashes, so no file is downloaded from GitHub
+        with self._lock:
+            if self._seeded:
+                return
+            self._seeded = True
+        try:
+            hashes = backend.file_hashes(directory)
+        except Exception as e:
+            logger.warning("Could not read stored file hashes: %s", e)
+            with self._lock:
+                self._seeded = False  # try again with the next writer
+            return
+        with self._lock:
+            for path, digest in hashes.items():
+                self._by_content.setdefault((log_player(path), digest), path)
+                self._stored.add((log_player(path), digest))
+
+    def mark_stored(self, files):
+        # (player_name, content) pairs that were just written
+        with self._lock:
+            self._stored.update((name, content_hash(content)) for name, content in files)
+
+    def stored(self, player_name, digest):
+        with self._lock:
+            return (player_name, digest) in self._stored
+
+    def forget(self, path):
+        # After a write failed for good, so a later retry is not skipped
+        with self._lock:
+            self._by_content = {k: p for k, p in self._by_content.items() if p != path}
+            self._by_session = {k: p for k, p in self._by_session.items() if p != path}
+
+    def __len__(self):
+        return len(self._by_content)
+
+
+# Shared by every writer in the process, so it outlives a writer that is
+# rebuilt after a failed health check
+UPLOAD_INDEX = UploadIndex()
+
+
+# --- Write listeners ---
+# Called with the (path, content) pairs of every batch that was stored, by
+# every writer in the process, e.g. to keep the cohort dashboard current.
+_write_listeners = []
+
+
+def add_write_listener(callback):
+    if callback not in _write_listeners:
+        _write_listeners.append(callback)
+
+
+def remove_write_listener(callback):
+    if callback in _write_listeners:
+        _write_listeners.remove(callback)
+
+
+def _notify_written(files):
+    for callback in list(_write_listeners):
+        try:
+            callback(files)
+        except Exception:
+            logger.exception("Write listener failed")
+
+
+# --- Background writer ---
+class ResultWriter:
+    def __init__(self, backend, batch_size=20, batch_wait=2.0,
+                 max_retries=5, base_delay=1.0, index=None):
+        self.backend = backend
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.failed = []
+        self.written = 0
+        self.skipped = 0
+        self.index = UploadIndex() if index is None else index
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, path, content, player_name="", session_id=None):
+        # Non-blocking: the file is written by the background thread. Returns
+        # the path it is stored under; repeated uploads are skipped here.
+        path, new = self.index.claim(path, content, player_name, session_id)
+        if not new:
+            self.skipped += 1
+            return path
+        self._ensure_thread()
+        self._queue.put((path, content, player_name))
+        return path
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def healthy(self):
+        return self.backend.ping()
+
+    def flush(self, timeout=None):
+        # Block until everything submitted so far has been written or failed.
+        # Returns False if the timeout ran out first.
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="result-writer", daemon=True)
+                self._thread.start()
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                self._write_with_retry(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write_with_retry(self, batch):
+        # A later snapshot of the same session replaces an earlier one still queued
+        latest = {path: content for path, content, _ in batch}
+        files = list(latest.items())
+        names = [name for _, _, name in batch if name]
+        if len(names) == 1:
+            message = f"Add results for {names[0]}"
+        else:
+            message = f"Add results for {len(batch)} participants"
+        for attempt in range(self.max_retries + 1):
+            try:
+                with stage("persist_write"):
+                    self.backend.write_batch(files, message)
+                self.written += len(files)
+                self.index.mark_stored([(name, content) for path, content, name in batch
+                                        if latest[path] is content])
+                _notify_written(files)
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.error("Giving up on %d result files: %s", len(files), e)
+                    self.failed.extend(batch)
+                    for path, _ in files:
+                        self.index.forget(path)
+                    return
+                delay = self.base_delay * 2 ** attempt
+                logger.warning("Saving results failed (%s), retrying in %.1fs", e, delay)
+                time.sleep(delay)
+
+
+_failed_check_at = -HEALTH_TTL
+
+
+def _drain(writer):
+    # The dropped writer's thread keeps working through its queue
+    if not writer.flush(30):
+        logger.warning("Replaced result writer still has %d files queued", writer.pending())
+
+
+def _writer_healthy(writer):
+    # Runs on every cache hit, inside a participant's script run, so it must
+    # not block. A failing health check drops the cached writer so the next
+    # call builds a fresh client; the old one drains in the background. After
+    # a failure the check is skipped for HEALTH_TTL, so an outage costs one
+    # ping per minute instead of one per rerun.
+    global _failed_check_at
+    if time.monotonic() - _failed_check_at < HEALTH_TTL:
+        return True
+    if writer.healthy():
+        return True
+    _failed_check_at = time.monotonic()
+    threading.Thread(target=_drain, args=(writer,), name="result-writer-drain", daemon=True).start()
+    return False
+
+
+@st.cache_resource(validate=_writer_healthy)
+def get_result_writer():
+    # One writer and storage client per server process, shared by all sessions
+    writer = ResultWriter(make_backend(st.secrets), index=UPLOAD_INDEX)
+    # Stored files join the index in the background, off the participant's run
+    threading.Thread(target=UPLOAD_INDEX.seed, args=(writer.backend,),
+                     name="upload-index-seed", daemon=True).start()
+    # Give queued results a chance to land when the server shuts down
+    atexit.register(writer.flush, 30)
+    return writer
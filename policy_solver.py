@@ -0,0 +1,208 @@
+# policy_solver.py
+# Exact optimal play under the montyhall_not_ok.py point rules, by dynamic
+# programming instead of simulation. A game is two round sets of
+# `trials_per_round` trials; the state before a trial is (round set, trial,
+# points). Each trial the player switches or stays, pays that action's cost
+# for the round set, wins `bonus` with the action's analytic win probability
+# and moves on; a costly action is refused when points < cost, so only the
+# other one is available.
+# Points only ever move by multiples of g = gcd(bonus, costs), so every state
+# of a trial is one cell of a points grid and the value table is filled
+# backwards one trial at a time with whole-array NumPy operations; the
+# final-points distribution is then pushed forwards through the chosen
+# actions. With exact=True the tables hold Fractions, so the expected score
+# and the distribution carry no rounding or sampling error at all.
+#
+#   python policy_solver.py [--trials 3] [--cost 10] [--bonus 100] [--start 50]
+import argparse
+import math
+from fractions import Fraction
+from typing import NamedTuple
+
+import numpy as np
+
+from game_engine import check_rules
+
+# Same defaults as montyhall_not_ok.py
+START_POINTS = 50
+WIN_BONUS = 100
+TRIALS_PER_ROUND = 3
+ACTION_COST = 10
+N_CARDS = 3
+
+
+def round_costs(cost=ACTION_COST):
+    # (switch_cost, stay_cost) per round set: switching costs in round 1,
+    # staying in round 2
+    return ((cost, 0), (0, cost))
+
+
+def exact_win_probabilities(n_cards=N_CARDS, reveals=1):
+    # game_engine.win_probabilities as Fractions: (switch, stay)
+    check_rules(n_cards, reveals)
+    return Fraction(n_cards - 1, n_cards * (n_cards - 1 - reveals)), Fraction(1, n_cards)
+
+
+class Solution(NamedTuple):
+    expected_points: float  # a Fraction when solved with exact=True
+    distribution: dict  # final points -> probability
+    points: np.ndarray  # the points grid
+    switch: np.ndarray  # (trials, grid) bool, True where the policy switches
+    reachable: np.ndarray  # (trials, grid) bool, states the policy can reach
+    trials_per_round: int
+
+    def action(self, round_set, trial, points):
+        # "switch" or "stay"; round_set and trial count from 1 as on screen
+        t = (round_set - 1) * self.trials_per_round + trial - 1
+        i = np.searchsorted(self.points, points)
+        if i == len(self.points) or self.points[i] != points:
+            raise KeyError(f"{points} points cannot occur under these rules")
+        return "switch" if self.switch[t, i] else "stay"
+
+    def policy(self):
+        # {(round_set, trial, points): action} for every reachable state
+        return {(t // self.trials_per_round + 1, t % self.trials_per_round + 1, int(p)):
+                "switch" if s else "stay"
+                for t in range(len(self.switch))
+                for p, s in zip(self.points[self.reachable[t]], self.switch[t][self.reachable[t]])}
+
+
+class _Game:
+    # The points grid and per-trial transitions for one setting
+    def __init__(self, start, bonus, trials_per_round, costs, n_cards, reveals, exact):
+        if trials_per_round < 1:
+            raise ValueError("trials_per_round must be at least 1")
+        if any(c < 0 for pair in costs for c in pair) or bonus < 0:
+            raise ValueError("bonus and costs must not be negative")
+        if any(min(pair) > 0 for pair in costs):
+            raise ValueError("one action per round set must be free, as in the app")
+        self.trials_per_round = trials_per_round
+        self.costs = [costs[t // trials_per_round] for t in range(len(costs) * trials_per_round)]
+        self.bonus = bonus
+        self.step = math.gcd(bonus, *(c for pair in costs for c in pair)) or 1
+        lowest = start - sum(max(pair) for pair in self.costs)
+        highest = start + bonus * len(self.costs)
+        self.points = np.arange(lowest, highest + 1, self.step)
+        self.start_index = (start - lowest) // self.step
+        win = exact_win_probabilities(n_cards, reveals)
+        self.dtype = object if exact else np.float64
+        self.p_win = win if exact else tuple(float(p) for p in win)  # (switch, stay)
+
+    def shifted(self, values, by):
+        # values[i + by], with cells that would fall off the grid left at 0;
+        # those only belong to states that cannot be reached
+        out = np.zeros_like(values)
+        if by >= 0:
+            out[:len(values) - by] = values[by:]
+        else:
+            out[-by:] = values[:by]
+        return out
+
+    def expected_after(self, values, p, cost):
+        # Expected next-trial value after an action that costs `cost` and
+        # wins with probability p, for every current state
+        lose = self.shifted(values, -cost // self.step)
+        win = self.shifted(values, (self.bonus - cost) // self.step)
+        return p * win + (1 - p) * lose
+
+    def forward(self, switch):
+        # Distribution over the grid before each trial and after the last one
+        dist = np.zeros(len(self.points), dtype=self.dtype)
+        dist[self.start_index] = Fraction(1) if self.dtype is object else 1.0
+        reachable = np.zeros(switch.shape, dtype=bool)
+        for t, (switch_cost, stay_cost) in enumerate(self.costs):
+            reachable[t] = dist != 0
+            nxt = np.zeros_like(dist)
+            for chosen, p, cost in ((switch[t], self.p_win[0], switch_cost),
+                                    (~switch[t], self.p_win[1], stay_cost)):
+                mass = np.where(chosen, dist, 0)
+                nxt += p * self.shifted(mass, -(self.bonus - cost) // self.step)
+                nxt += (1 - p) * self.shifted(mass, cost // self.step)
+            dist = nxt
+        return dist, reachable
+
+    def solution(self, switch):
+        dist, reachable = self.forward(switch)
+        keep = dist != 0
+        distribution = {int(p): q for p, q in zip(self.points[keep], dist[keep])}
+        expected = sum((p * q for p, q in distribution.items()), Fraction(0) if self.dtype is object else 0.0)
+        return Solution(expected, distribution, self.points, switch, reachable, self.trials_per_round)
+
+
+def solve(start=START_POINTS, bonus=WIN_BONUS, trials_per_round=TRIALS_PER_ROUND,
+          costs=None, n_cards=N_CARDS, reveals=1, exact=False):
+    # Policy maximizing the expected final points. Ties go to switching.
+    game = _Game(start, bonus, trials_per_round, round_costs() if costs is None else costs,
+                 n_cards, reveals, exact)
+    values = game.points.astype(game.dtype)  # after the last trial: the points themselves
+    switch = np.zeros((len(game.costs), len(game.points)), dtype=bool)
+    for t in reversed(range(len(game.costs))):
+        switch_cost, stay_cost = game.costs[t]
+        by_switch = game.expected_after(values, game.p_win[0], switch_cost)
+        by_stay = game.expected_after(values, game.p_win[1], stay_cost)
+        can_switch = game.points >= switch_cost
+        can_stay = game.points >= stay_cost
+        switch[t] = can_switch & (~can_stay | (by_switch >= by_stay))
+        values = np.where(switch[t], by_switch, by_stay)
+    return game.solution(switch)
+
+
+def evaluate(rule, start=START_POINTS, bonus=WIN_BONUS, trials_per_round=TRIALS_PER_ROUND,
+             costs=None, n_cards=N_CARDS, reveals=1, exact=False):
+    # Exact score of a fixed rule(round_set, trial, points) -> bool array
+    # (True = switch), called with the whole points grid. A refused choice
+    # falls back to the other action, like in the app.
+    game = _Game(start, bonus, trials_per_round, round_costs() if costs is None else costs,
+                 n_cards, reveals, exact)
+    switch = np.zeros((len(game.costs), len(game.points)), dtype=bool)
+    for t, (switch_cost, stay_cost) in enumerate(game.costs):
+        wants = np.broadcast_to(rule(t // trials_per_round + 1, t % trials_per_round + 1, game.points),
+                                game.points.shape)
+        switch[t] = np.where(wants, game.points >= switch_cost, game.points < stay_cost)
+    return game.solution(switch)
+
+
+def always(action):
+    return lambda round_set, trial, points: action == "switch"
+
+
+def describe(solution):
+    # One line per trial: the action, or the points at which each is chosen
+    lines = []
+    for t in range(len(solution.switch)):
+        reach = solution.reachable[t]
+        choices = {}
+        for name, mask in (("switch", solution.switch[t]), ("stay", ~solution.switch[t])):
+            pts = solution.points[reach & mask]
+            if len(pts):
+                choices[name] = pts
+        round_set, trial = t // solution.trials_per_round + 1, t % solution.trials_per_round + 1
+        if len(choices) == 1:
+            text = next(iter(choices))
+        else:
+            text = "; ".join(f"{name} at {', '.join(map(str, pts[:8]))}{' ...' if len(pts) > 8 else ''}"
+                             for name, pts in choices.items())
+        lines.append(f"Round {round_set} trial {trial}: {text}")
+    return lines
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exact optimal policy for the round 1 / round 2 point rules")
+    parser.add_argument("--trials", type=int, default=TRIALS_PER_ROUND, help="trials per round set")
+    parser.add_argument("--cost", type=int, default=ACTION_COST)
+    parser.add_argument("--bonus", type=int, default=WIN_BONUS)
+    parser.add_argument("--start", type=int, default=START_POINTS)
+    parser.add_argument("--cards", type=int, default=N_CARDS)
+    parser.add_argument("--exact", action="store_true", help="rational arithmetic (slower)")
+    args = parser.parse_args()
+    setting = dict(start=args.start, bonus=args.bonus, trials_per_round=args.trials,
+                   costs=round_costs(args.cost), n_cards=args.cards, exact=args.exact)
+    best = solve(**setting)
+    print(f"Optimal expected final points: {float(best.expected_points):.3f}")
+    for name in ("switch", "stay"):
+        print(f"Always {name}: {float(evaluate(always(name), **setting).expected_points):.3f}")
+    print("\nOptimal policy:")
+    print("\n".join(describe(best)))
+    print("\nFinal points distribution:")
+    for points, p in best.distribution.items():
+        print(f"  {points:6d}  {float(p):.6f}")
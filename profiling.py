@@ -0,0 +1,129 @@
+# profiling.py
+# Stage timers for the apps' hot paths. `with stage("name"):` records the
+# wall time and the net number of allocated memory blocks of the block into a
+# rolling per-stage buffer; summary() gives p50/p95/p99 per stage.
+# Off unless MONTYHALL_PROFILE=1: stage() then returns one shared no-op
+# context manager, so an instrumented block costs a function call and an
+# attribute check. Open an app with ?admin=profile to see the numbers, or set
+# MONTYHALL_PROFILE_EXPORT=path.csv to dump them at exit.
+import atexit
+import contextlib
+import os
+import sys
+import threading
+import time
+from collections import deque
+from functools import wraps
+
+BUFFER_SIZE = 2048  # samples kept per stage
+PERCENTILES = (50, 95, 99)
+ADMIN_PARAM = "admin"
+_NULL = contextlib.nullcontext()
+
+
+class Profiler:
+    def __init__(self, enabled=False, buffer_size=BUFFER_SIZE):
+        self.enabled = enabled
+        self.buffer_size = buffer_size
+        self._samples = {}  # stage -> deque of (seconds, blocks)
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds, blocks):
+        with self._lock:
+            buf = self._samples.get(name)
+            if buf is None:
+                buf = self._samples[name] = deque(maxlen=self.buffer_size)
+            buf.append((seconds, blocks))
+
+    def stage(self, name):
+        if not self.enabled:
+            return _NULL
+        return _Stage(self, name)
+
+    def reset(self):
+        with self._lock:
+            self._samples = {}
+
+    def summary(self):
+        # One row per stage: sample count, p50/p95/p99/max in ms, mean blocks
+        import numpy as np
+        import pandas as pd
+
+        with self._lock:
+            samples = {name: list(buf) for name, buf in self._samples.items()}
+        rows = []
+        for name, values in sorted(samples.items()):
+            seconds = np.array([s for s, _ in values]) * 1000
+            blocks = np.array([b for _, b in values])
+            row = {"stage": name, "count": len(values)}
+            for p, v in zip(PERCENTILES, np.percentile(seconds, PERCENTILES)):
+                row[f"p{p}_ms"] = v
+            row["max_ms"] = seconds.max()
+            row["mean_blocks"] = blocks.mean()
+            rows.append(row)
+        columns = ["stage", "count"] + [f"p{p}_ms" for p in PERCENTILES] + ["max_ms", "mean_blocks"]
+        return pd.DataFrame(rows, columns=columns)
+
+    def export(self, path):
+        self.summary().to_csv(path, index=False)
+
+
+class _Stage:
+    __slots__ = ("profiler", "name", "start", "blocks")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.blocks = sys.getallocatedblocks()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        self.profiler.record(self.name, elapsed, sys.getallocatedblocks() - self.blocks)
+        return False
+
+
+PROFILER = Profiler(enabled=os.environ.get("MONTYHALL_PROFILE", "") not in ("", "0"))
+
+
+def stage(name):
+    return PROFILER.stage(name)
+
+
+def timed(name):
+    # Decorator form of stage(), e.g. for on_click callbacks
+    def wrap(func):
+        @wraps(func)
+        def run(*args, **kwargs):
+            if not PROFILER.enabled:
+                return func(*args, **kwargs)
+            with _Stage(PROFILER, name):
+                return func(*args, **kwargs)
+        return run
+    return wrap
+
+
+def show_admin_view():
+    # Per-stage percentiles in the sidebar, on every page, only when the app
+    # is opened with ?admin=profile
+    import streamlit as st
+
+    if st.query_params.get(ADMIN_PARAM) != "profile":
+        return
+    with st.sidebar:
+        st.subheader("⏱️ Stage timings")
+        if not PROFILER.enabled:
+            st.info("Profiling is off. Start the app with MONTYHALL_PROFILE=1.")
+            return
+        summary = PROFILER.summary()
+        st.dataframe(summary, use_container_width=True)
+        st.download_button("Export CSV", summary.to_csv(index=False),
+                           file_name="stage_timings.csv", mime="text/csv")
+
+
+_export_path = os.environ.get("MONTYHALL_PROFILE_EXPORT")
+if PROFILER.enabled and _export_path:
+    atexit.register(PROFILER.export, _export_path)
@@ -0,0 +1,83 @@
+# round_log.py
+# Append-only columnar log of played rounds. Appending a round is O(1); a
+# pandas DataFrame is only built when something asks for one (st.dataframe,
+# summaries, CSV export) and is cached until the next append. Numeric columns
+# are stored in typed arrays (1-8 bytes per value instead of a Python object).
+from array import array
+
+# Column layouts used by the apps. schedule_key is the session's cohort slot
+# its layouts were drawn for (trial_schedule.py), so a session can be replayed.
+GAME_LOG_COLUMNS = ["round_number", "first_choice", "flipped_card", "second_choice",
+                    "result", "phase_type", "trophy_card", "schedule_key"]
+TRIAL_LOG_COLUMNS = ["trial_number", "first_choice", "flipped_card", "second_choice",
+                     "trophy_card", "result", "switch_win", "stay_win", "email", "schedule_key"]
+EXPERIMENT_LOG_COLUMNS = ["round_number", "first_choice", "flipped_card", "second_choice",
+                          "trophy_card", "result", "phase_type", "points_after_round",
+                          "switch_win", "stay_win", "email", "schedule_key"]
+
+# array typecodes for numeric columns; anything not listed is kept in a list
+COLUMN_TYPES = {
+    "round_number": "l", "trial_number": "l", "points_after_round": "l",
+    "first_choice": "h", "flipped_card": "h", "second_choice": "h", "trophy_card": "h",
+    "phase_type": "b", "switch_win": "b", "stay_win": "b", "result": "b",
+}
+BOOL_COLUMNS = {"result"}
+
+
+class RoundLog:
+    __slots__ = ("columns", "_data", "_frame")
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self._data = {c: array(COLUMN_TYPES[c]) if c in COLUMN_TYPES else [] for c in self.columns}
+        self._frame = None
+
+    def __getstate__(self):
+        # The cached DataFrame is rebuilt on demand, never serialized
+        return {"columns": self.columns, "_data": self._data, "_frame": None}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def __len__(self):
+        return len(self._data[self.columns[0]])
+
+    def append(self, **row):
+        unknown = set(row) - set(self._data)
+        if unknown:
+            raise KeyError(f"Unknown log columns: {sorted(unknown)}")
+        for c in self.columns:
+            self._data[c].append(row.get(c))
+        self._frame = None
+
+    def clear(self):
+        for c in self.columns:
+            self._data[c] = array(COLUMN_TYPES[c]) if c in COLUMN_TYPES else []
+        self._frame = None
+
+    def column(self, name):
+        return self._data[name]
+
+    def count(self, name, value):
+        return sum(1 for v in self._data[name] if v == value)
+
+    def sum(self, name, where=None, equals=None):
+        # Sum of a column, optionally only over rows where column `where` == `equals`
+        values = self._data[name]
+        if where is None:
+            return sum(v for v in values if v is not None)
+        mask = self._data[where]
+        return sum(v for v, m in zip(values, mask) if m == equals and v is not None)
+
+    def to_frame(self):
+        if self._frame is None:
+            import pandas as pd
+
+            data = {c: [bool(v) for v in values] if c in BOOL_COLUMNS else list(values)
+                    for c, values in self._data.items()}
+            self._frame = pd.DataFrame(data, columns=self.columns)
+        return self._frame
+
+    def to_csv(self):
+        return self.to_frame().to_csv(index=False)
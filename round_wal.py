@@ -0,0 +1,422 @@
+# round_wal.py
+# Durable per-round write-ahead log. Every logged round is appended as one
+# JSON line to this process's segment file under round_wal/ (fsync'd in
+# batches by a background thread, at most FSYNC_INTERVAL after the append),
+# so a dropped tab or a crashed worker loses at most that window. Ending an
+# experiment only appends a small "close" record; the Compactor later turns
+# closed sessions into the usual per-participant CSV and hands it to the
+# ResultWriter. Sessions with no activity for ABANDON_AFTER are written out
+# as they are, so partial runs are kept too.
+#
+# Records: {"t": "open", "sid", "participant", "columns", "ts"}
+#          {"t": "row", "sid", "seq", "ts", "row": {...}}
+#          {"t": "close", "sid", "path", "ts"}
+# Each process appends to its own segment, holding an flock on it while it is
+# open; segments of other processes are only read. "seq" is the row's
+# position in the session's log: a session resumed on another worker writes
+# into a different segment, so rows are put in order by seq, never by
+# segment; a row written again at the same seq (a worker died before its
+# state was saved) replaces the older one.
+# Each pass the compactor folds the records of every segment into a state
+# file per session under sessions/, and only then deletes the segments no
+# writer holds, so the rows a session has never shrink. A file counts as
+# written once UploadIndex.stored() confirms it, not when it is queued;
+# until then it is submitted again every pass. A session that is closed and
+# confirmed is final: it moves to done.log, which is only appended to, and
+# later records for it are ignored. A session written out as abandoned keeps
+# its path when more rows or a close arrive, and is final FORGET_AFTER after
+# its last record. Ages come from record timestamps, never file times.
+# MONTYHALL_WAL_DIR="" turns the log off; results are then uploaded in one
+# piece at the end as before. The same happens where fcntl is unavailable
+# (Windows), since segments are marked live with flock.
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+import streamlit as st
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, no WAL
+    fcntl = None
+
+from persistence import UPLOAD_INDEX, content_hash, get_result_writer, log_path
+from round_log import RoundLog
+
+WAL_DIR = os.environ.get("MONTYHALL_WAL_DIR", "round_wal")
+FSYNC_INTERVAL = 0.2  # seconds between group fsyncs
+SEGMENT_BYTES = 4 * 1024 * 1024  # rotate the active segment after this size
+COMPACT_INTERVAL = 5.0
+ABANDON_AFTER = 2 * 3600.0  # seconds without a record before a session is written out unfinished
+FORGET_AFTER = 7 * 24 * 3600.0  # ... and before a written-out unfinished session is final
+DONE_LOG = "done.log"
+SESSION_DIR = "sessions"
+LOCK_FILE = ".compact.lock"
+
+logger = logging.getLogger(__name__)
+
+
+def _dumps(record):
+    return (json.dumps(record, separators=(",", ":"), ensure_ascii=False) + "\n").encode("utf-8")
+
+
+class RoundWAL:
+    def __init__(self, directory=WAL_DIR, fsync_interval=FSYNC_INTERVAL, segment_bytes=SEGMENT_BYTES):
+        self.directory = directory
+        self.fsync_interval = fsync_interval
+        self.segment_bytes = segment_bytes
+        self._lock = threading.Lock()
+        self._opened = set()  # sessions with an "open" record in the active segment
+        self._fd = None
+        self._size = 0
+        self._segment = 0
+        self._dirty = False
+        self._stop = threading.Event()
+        self._flusher = None
+        os.makedirs(directory, exist_ok=True)
+
+    # --- Writing ---
+    def _open_segment(self):
+        name = f"wal-{os.getpid()}-{time.time_ns()}-{self._segment}.log"
+        self._segment += 1
+        # Locked under a temporary name, so no compactor ever sees the new
+        # segment unlocked and deletes it
+        tmp = os.path.join(self.directory, "." + name)
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        fcntl.flock(fd, fcntl.LOCK_EX)  # marks the segment as live for compactors
+        os.rename(tmp, os.path.join(self.directory, name))
+        self._fd, self._size = fd, 0
+        self._opened = set()
+
+    def _write(self, data):
+        # Caller holds self._lock
+        if self._fd is None or self._size >= self.segment_bytes:
+            self._rotate()
+        os.write(self._fd, data)
+        self._size += len(data)
+        self._dirty = True
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, name="wal-fsync", daemon=True)
+            self._flusher.start()
+
+    def _rotate(self):
+        if self._fd is not None:
+            os.fsync(self._fd)
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+        self._open_segment()
+
+    def append_round(self, sid, participant, columns, seq, row):
+        # One logged round, row number `seq` of the session; the session's
+        # "open" record is written first
+        with self._lock:
+            if self._fd is None or self._size >= self.segment_bytes:
+                self._rotate()
+            if sid not in self._opened:
+                self._write(_dumps({"t": "open", "sid": sid, "participant": participant,
+                                    "columns": list(columns), "ts": time.time()}))
+                self._opened.add(sid)
+            self._write(_dumps({"t": "row", "sid": sid, "seq": seq, "ts": time.time(), "row": row}))
+
+    def close_session(self, sid, path):
+        # End of the experiment: O(1), the CSV is built by the compactor
+        with self._lock:
+            self._write(_dumps({"t": "close", "sid": sid, "path": path, "ts": time.time()}))
+        self.sync()
+
+    def sync(self):
+        with self._lock:
+            if self._fd is not None and self._dirty:
+                os.fsync(self._fd)
+                self._dirty = False
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.fsync_interval):
+            try:
+                self.sync()
+            except OSError as e:
+                logger.error("WAL fsync failed: %s", e)
+
+    def close(self):
+        self._stop.set()
+        with self._lock:
+            if self._fd is not None:
+                os.fsync(self._fd)
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+                os.close(self._fd)
+                self._fd = None
+
+
+# --- Reading and compaction ---
+def segment_files(directory):
+    return sorted(os.path.join(directory, n) for n in os.listdir(directory)
+                  if n.startswith("wal-") and n.endswith(".log"))
+
+
+def read_records(path):
+    # Complete lines only; a torn last line from a crash is skipped
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def segment_in_use(path):
+    # A live writer holds an exclusive flock on its active segment
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return True
+    else:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        return False
+    finally:
+        os.close(fd)
+
+
+def _write_json(path, data):
+    # Atomic replace, fsync'd before the rename
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def load_done(directory):
+    # sid -> {"path", "rows"} for every final session
+    done = {}
+    path = os.path.join(directory, DONE_LOG)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                done[entry.pop("sid")] = entry
+    return done
+
+
+def add_done(directory, entries):
+    # Final sessions are only ever appended
+    with open(os.path.join(directory, DONE_LOG), "a", encoding="utf-8") as f:
+        f.writelines(json.dumps({"sid": sid, **entry}, ensure_ascii=False) + "\n"
+                     for sid, entry in entries.items())
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _new_session():
+    return {"participant": "", "columns": None, "opened": None, "last": 0.0, "rows": {},
+            "close_path": None, "path": None, "written": 0, "digest": None, "stored": False}
+
+
+def load_sessions(directory):
+    # sid -> compacted state of every session that is not final yet
+    sessions = {}
+    folder = os.path.join(directory, SESSION_DIR)
+    for name in os.listdir(folder) if os.path.isdir(folder) else ():
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(folder, name), encoding="utf-8") as f:
+                s = json.load(f)
+        except ValueError:
+            continue
+        s["rows"] = {seq: (ts, row) for seq, ts, row in s["rows"]}
+        sessions[name[:-len(".json")]] = s
+    return sessions
+
+
+def save_session(directory, sid, s):
+    folder = os.path.join(directory, SESSION_DIR)
+    os.makedirs(folder, exist_ok=True)
+    data = dict(s, rows=[[seq, ts, row] for seq, (ts, row) in sorted(s["rows"].items())])
+    _write_json(os.path.join(folder, f"{sid}.json"), json.dumps(data, ensure_ascii=False))
+
+
+def drop_session(directory, sid):
+    try:
+        os.remove(os.path.join(directory, SESSION_DIR, f"{sid}.json"))
+    except FileNotFoundError:
+        pass
+
+
+def merge_record(s, rec):
+    # Fold one WAL record into a session's state; True if it changed anything.
+    # A session's age comes from its records' timestamps only.
+    last = s["last"]
+    s["last"] = max(last, rec.get("ts", 0.0))
+    changed = s["last"] != last
+    if rec["t"] == "open":
+        changed |= s["columns"] is None or s["opened"] is None
+        s["participant"] = rec["participant"]
+        s["columns"] = s["columns"] or rec["columns"]
+        s["opened"] = s["opened"] or rec["ts"]
+    elif rec["t"] == "row":
+        # The latest write of a seq wins
+        old = s["rows"].get(rec["seq"])
+        if old is None or (old[0] < rec["ts"] and old[1] != rec["row"]):
+            s["rows"][rec["seq"]] = (rec["ts"], rec["row"])
+            changed = True
+    elif rec["t"] == "close":
+        changed |= s["close_path"] is None
+        s["close_path"] = s["close_path"] or rec["path"]
+    return changed
+
+
+class Compactor:
+    # Writes closed (or abandoned) sessions out through submit(path, content,
+    # player_name, session_id), and counts a session as written only once
+    # stored(player_name, content_hash) confirms the content reached storage
+    def __init__(self, directory, submit, stored, interval=COMPACT_INTERVAL,
+                 abandon_after=ABANDON_AFTER, forget_after=FORGET_AFTER):
+        self.directory = directory
+        self.submit = submit
+        self.stored = stored
+        self.interval = interval
+        self.abandon_after = abandon_after
+        self.forget_after = forget_after
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="wal-compactor", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.compact()
+            except Exception:
+                logger.exception("WAL compaction failed")
+
+    def compact(self, now=None):
+        # One pass; returns the number of files submitted. Only one compactor
+        # per directory works at a time.
+        now = time.time() if now is None else now
+        lock_fd = os.open(os.path.join(self.directory, LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            try:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return 0
+            return self._compact(now)
+        finally:
+            os.close(lock_fd)
+
+    def _compact(self, now):
+        done = load_done(self.directory)
+        sessions = load_sessions(self.directory)
+        for sid in [sid for sid in sessions if sid in done]:  # left by a crash after add_done
+            drop_session(self.directory, sid)
+            del sessions[sid]
+
+        segments = [(path, segment_in_use(path)) for path in segment_files(self.directory)]
+        changed = set()  # sessions whose saved state is behind
+        for path, in_use in segments:
+            for rec in read_records(path):
+                sid = rec["sid"]
+                if sid in done:
+                    continue  # final: later records never rewrite its file
+                s = sessions.setdefault(sid, _new_session())
+                # Rows of a segment that is about to be deleted must be saved
+                if merge_record(s, rec) and not in_use:
+                    changed.add(sid)
+
+        written, final = 0, {}
+        for sid, s in sessions.items():
+            rows = len(s["rows"])
+            closed = s["close_path"] is not None
+            if s["columns"] is None or not rows:
+                continue
+            if not closed and now - s["last"] < self.abandon_after:
+                continue
+            if s["written"] != rows or not s["stored"]:
+                # First write, more rows, or a write that was not confirmed
+                # (still queued, or given up by the writer): submit again. A
+                # file already written keeps its path.
+                log = RoundLog(s["columns"])
+                for _, (_, row) in sorted(s["rows"].items()):
+                    log.append(**row)
+                content = log.to_csv()
+                digest = content_hash(content)
+                if s["path"] is None:
+                    s["path"] = s["close_path"] or log_path(s["participant"], datetime.fromtimestamp(s["opened"]))
+                if s["digest"] != digest or not self.stored(s["participant"], digest):
+                    self.submit(s["path"], content, s["participant"], sid)
+                    written += 1
+                s["written"], s["digest"] = rows, digest
+                s["stored"] = self.stored(s["participant"], digest)
+                changed.add(sid)
+            if s["stored"] and (closed or now - s["last"] >= self.forget_after):
+                final[sid] = {"path": s["path"], "rows": rows}
+
+        # Save before any segment goes, so deleting one never loses rows
+        for sid in changed - final.keys():
+            save_session(self.directory, sid, sessions[sid])
+        if final:
+            add_done(self.directory, final)
+            for sid in final:
+                drop_session(self.directory, sid)
+        for path, in_use in segments:
+            if not in_use:
+                os.remove(path)
+        return written
+
+
+@st.cache_resource
+def get_round_wal():
+    # One WAL and compactor per server process; compacted sessions go through
+    # the shared ResultWriter
+    if not WAL_DIR or fcntl is None:
+        return None
+    wal = RoundWAL()
+    compactor = Compactor(wal.directory, lambda *file: get_result_writer().submit(*file),
+                          UPLOAD_INDEX.stored)
+    compactor.start()
+
+    def shutdown():
+        # Submit what is closed, wait for the writer, then record what landed
+        wal.close()
+        compactor.compact()
+        get_result_writer().flush(30)
+        compactor.compact()
+
+    atexit.register(shutdown)
+    return wal
+
+
+# --- App hooks ---
+def record_round(sid, participant, log, **row):
+    # Append a finished round to the session's log and to the WAL
+    log.append(**row)
+    wal = get_round_wal()
+    if wal is not None:
+        wal.append_round(sid, participant, log.columns, len(log) - 1, row)
+
+
+def finish_session(sid, participant, log, when):
+    # End of the experiment. Returns the results path; the file itself is
+    # built from the WAL by the compactor, or uploaded whole without a WAL.
+    path = log_path(participant, when)
+    wal = get_round_wal()
+    if wal is None:
+        return get_result_writer().submit(path, log.to_csv(), participant, sid)
+    wal.close_session(sid, path)
+    return path
@@ -0,0 +1,119 @@
+# session_store.py
+# Shared store for session progress, so several app processes can serve one
+# cohort without sticky sessions and a crashed worker loses nobody. Each
+# session's state object (round logs included) is saved after every action
+# as one pickled row keyed by a session id that lives in the URL (?sid=...);
+# a worker that has never seen the session loads it from the store.
+# Rows carry a version number, so a save from a worker holding an outdated
+# copy is refused instead of overwriting newer progress.
+#
+# MONTYHALL_SESSION_STORE selects the backend:
+#   unset         sessions stay in the worker's memory only
+#   sqlite:PATH   one SQLite file (WAL mode) shared by workers on one host
+#   memory        in-process dict, for tests
+# A store needs load(sid) -> (version, blob) | None and
+# save(sid, blob, version) -> new version | None, where `version` is the
+# version the caller last loaded (0 for a new session) and None means the
+# store holds a newer one, plus next_value(name) -> 0, 1, 2, ... for a
+# counter shared by all workers (trial_schedule.py enrolls sessions with it).
+import os
+import sqlite3
+import threading
+import time
+
+STORE_ENV = "MONTYHALL_SESSION_STORE"
+
+
+class MemorySessionStore:
+    def __init__(self):
+        self._rows = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def load(self, sid):
+        with self._lock:
+            return self._rows.get(sid)
+
+    def save(self, sid, blob, version):
+        with self._lock:
+            current = self._rows.get(sid, (0, None))[0]
+            if current != version:
+                return None
+            self._rows[sid] = (version + 1, blob)
+            return version + 1
+
+    def next_value(self, name):
+        with self._lock:
+            value = self._counters.get(name, 0)
+            self._counters[name] = value + 1
+            return value
+
+
+class SqliteSessionStore:
+    SCHEMA = """CREATE TABLE IF NOT EXISTS sessions (
+        sid TEXT PRIMARY KEY,
+        version INTEGER NOT NULL,
+        state BLOB NOT NULL,
+        updated_at REAL NOT NULL
+    )"""
+    COUNTERS = """CREATE TABLE IF NOT EXISTS counters (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    )"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(self.SCHEMA)
+            conn.execute(self.COUNTERS)
+
+    def _connect(self):
+        # One connection per thread; WAL lets readers run alongside the writer
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def load(self, sid):
+        row = self._connect().execute(
+            "SELECT version, state FROM sessions WHERE sid = ?", (sid,)).fetchone()
+        return None if row is None else (row[0], bytes(row[1]))
+
+    def save(self, sid, blob, version):
+        conn = self._connect()
+        if version == 0:
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO sessions (sid, version, state, updated_at) VALUES (?, 1, ?, ?)",
+                (sid, blob, time.time()))
+        else:
+            cur = conn.execute(
+                "UPDATE sessions SET version = version + 1, state = ?, updated_at = ? "
+                "WHERE sid = ? AND version = ?",
+                (blob, time.time(), sid, version))
+        return version + 1 if cur.rowcount == 1 else None
+
+    def next_value(self, name):
+        # One statement, so concurrent workers never get the same value
+        row = self._connect().execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1) "
+            "ON CONFLICT (name) DO UPDATE SET value = value + 1 RETURNING value", (name,)).fetchone()
+        return row[0] - 1
+
+
+def make_session_store(spec=None):
+    spec = os.environ.get(STORE_ENV, "") if spec is None else spec
+    if not spec:
+        return None
+    if spec == "memory":
+        return MemorySessionStore()
+    if spec.startswith("sqlite:"):
+        return SqliteSessionStore(spec[len("sqlite:"):])
+    raise ValueError(f"Unknown {STORE_ENV}: {spec}")
+
+
+SESSION_STORE = make_session_store()
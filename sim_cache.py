@@ -0,0 +1,125 @@
+# sim_cache.py
+# Memoized simulation results. Runs go through the sharded runner in
+# simulation.py with small shards, and each shard's win counts are cached per
+# (seed, n_cards, reveals, shard size, chunk size): in memory with LRU
+# eviction, and as one JSON file per configuration on disk, so they survive
+# restarts. Asking again for a cached run costs nothing. Asking for more games
+# with the same seed reuses every complete shard and only simulates the rest.
+# Counts are identical to simulate_parallel(..., shard_size=CACHE_SHARD).
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from simulation import DEFAULT_CHUNK, N_CARDS, _run_shard, shard_sizes
+
+CACHE_DIR = os.environ.get("MONTYHALL_SIM_CACHE", ".sim_cache")
+CACHE_SHARD = 100_000  # games per shard: the unit that is cached and reused
+MAX_ENTRIES = 128  # configurations kept in memory
+
+
+class SimulationCache:
+    def __init__(self, directory=CACHE_DIR, max_entries=MAX_ENTRIES, shard_size=CACHE_SHARD):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.shard_size = shard_size
+        self.hits = 0  # games served from the cache
+        self.misses = 0  # games simulated
+        self._entries = OrderedDict()  # config key -> {"index:size": [switch_wins, stay_wins]}
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        name = hashlib.sha256(json.dumps(key).encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.directory, f"{name}.json")
+
+    def _load(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return dict(self._entries[key])
+        shards = {}
+        if self.directory:
+            try:
+                with open(self._path(key), encoding="utf-8") as f:
+                    shards = json.load(f)["shards"]
+            except (OSError, ValueError, KeyError):
+                shards = {}
+        return shards
+
+    def _store(self, key, shards):
+        # A partial shard is superseded once the full shard is cached
+        full = {k.split(":")[0] for k in shards if int(k.split(":")[1]) == self.shard_size}
+        shards = {k: v for k, v in shards.items()
+                  if int(k.split(":")[1]) == self.shard_size or k.split(":")[0] not in full}
+        with self._lock:
+            self._entries[key] = shards
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(key)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"key": key, "shards": shards}, f)
+            os.replace(tmp, path)
+
+    def simulate(self, simulations, seed=None, n_cards=N_CARDS, reveals=1,
+                 workers=1, chunk_size=DEFAULT_CHUNK):
+        # Same result layout as simulation.simulate_parallel, plus
+        # "cached_games": how many of the games came from the cache
+        entropy = np.random.SeedSequence(seed).entropy
+        key = (str(entropy), n_cards, reveals, self.shard_size, chunk_size)
+        shards = self._load(key)
+        sizes = list(enumerate(shard_sizes(simulations, self.shard_size)))
+        missing = [(i, n) for i, n in sizes if f"{i}:{n}" not in shards]
+        if missing:
+            jobs = [(entropy, i, n, chunk_size, n_cards, reveals) for i, n in missing]
+            if workers == 1 or len(jobs) <= 1:
+                results = list(map(_run_shard, jobs))
+            else:
+                with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+                    results = list(pool.map(_run_shard, jobs))
+            for (i, n), (sw, sy) in zip(missing, results):
+                shards[f"{i}:{n}"] = [int(sw), int(sy)]
+            self._store(key, shards)
+        simulated = sum(n for _, n in missing)
+        with self._lock:
+            self.hits += int(simulations) - simulated
+            self.misses += simulated
+        switch_wins = sum(shards[f"{i}:{n}"][0] for i, n in sizes)
+        stay_wins = sum(shards[f"{i}:{n}"][1] for i, n in sizes)
+        return {
+            "games": int(simulations),
+            "switch_wins": switch_wins,
+            "stay_wins": stay_wins,
+            "seed": entropy,
+            "shards": len(sizes),
+            "cached_games": int(simulations) - simulated,
+        }
+
+    def win_rates(self, simulations, seed=None, n_cards=N_CARDS, reveals=1, workers=1):
+        # Returns (switch_rate, stay_rate), like simulation.win_rates
+        res = self.simulate(simulations, seed, n_cards, reveals, workers)
+        if res["games"] == 0:
+            return 0.0, 0.0
+        return res["switch_wins"] / res["games"], res["stay_wins"] / res["games"]
+
+    def clear(self, disk=False):
+        with self._lock:
+            self._entries.clear()
+        if disk and self.directory and os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith(".json"):
+                    os.remove(os.path.join(self.directory, name))
+
+
+SIM_CACHE = SimulationCache()
+
+
+def cached_win_rates(simulations, seed=None, n_cards=N_CARDS, reveals=1, workers=1):
+    return SIM_CACHE.win_rates(simulations, seed, n_cards, reveals, workers)
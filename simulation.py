@@ -0,0 +1,155 @@
+# simulation.py
+# Batched Monte Carlo engine for the Monty Hall card game (3 cards by default,
+# any N cards / k reveals through game_engine).
+# Replaces the one-game-per-loop `monty_hall()` from the notebook with NumPy
+# arrays drawn in chunks, so millions of games take milliseconds.
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from game_engine import sample_outcomes
+
+N_CARDS = 3
+DEFAULT_CHUNK = 1_000_000
+# Games per shard in the process-pool runner. Shards are fixed by the request
+# size, not by the worker count, so results do not depend on `workers`.
+DEFAULT_SHARD = 10_000_000
+
+
+def simulate_chunk(rng, size, n_cards=N_CARDS, reveals=1):
+    # One batch of games: returns (switch_wins, stay_wins) as ints.
+    return sample_outcomes(rng, size, n_cards, reveals)
+
+
+def simulate(simulations, seed=None, chunk_size=DEFAULT_CHUNK, n_cards=N_CARDS, reveals=1):
+    # Play `simulations` games and return {"games", "switch_wins", "stay_wins"}.
+    # Both strategies are scored on the same games.
+    rng = np.random.default_rng(seed)
+    switch_wins = stay_wins = 0
+    remaining = int(simulations)
+    while remaining > 0:
+        size = min(chunk_size, remaining)
+        sw, sy = simulate_chunk(rng, size, n_cards, reveals)
+        switch_wins += sw
+        stay_wins += sy
+        remaining -= size
+    return {"games": int(simulations), "switch_wins": switch_wins, "stay_wins": stay_wins}
+
+
+def win_rates(simulations, seed=None, chunk_size=DEFAULT_CHUNK, n_cards=N_CARDS, reveals=1):
+    # Returns (switch_rate, stay_rate).
+    res = simulate(simulations, seed=seed, chunk_size=chunk_size, n_cards=n_cards, reveals=reveals)
+    if res["games"] == 0:
+        return 0.0, 0.0
+    return res["switch_wins"] / res["games"], res["stay_wins"] / res["games"]
+
+
+def monty_hall(simulations, switch=True, seed=None):
+    # Drop-in replacement for the notebook's scalar `monty_hall()`.
+    switch_rate, stay_rate = win_rates(simulations, seed=seed)
+    return switch_rate if switch else stay_rate
+
+
+# --- Multi-core sharded runner ---
+def _run_shard(args):
+    entropy, shard_index, size, chunk_size, n_cards, reveals = args
+    # Shard i always gets the same independent child stream of the root seed
+    seq = np.random.SeedSequence(entropy, spawn_key=(shard_index,))
+    sw, sy = 0, 0
+    rng = np.random.default_rng(seq)
+    remaining = size
+    while remaining > 0:
+        n = min(chunk_size, remaining)
+        a, b = simulate_chunk(rng, n, n_cards, reveals)
+        sw += a
+        sy += b
+        remaining -= n
+    return sw, sy
+
+
+def shard_sizes(simulations, shard_size=DEFAULT_SHARD):
+    full, rest = divmod(int(simulations), shard_size)
+    return [shard_size] * full + ([rest] if rest else [])
+
+
+def simulate_parallel(simulations, seed=None, workers=None,
+                      shard_size=DEFAULT_SHARD, chunk_size=DEFAULT_CHUNK,
+                      n_cards=N_CARDS, reveals=1):
+    # Split `simulations` into shards, run them on a process pool and merge the
+    # win counts. Same seed + shard_size gives identical counts for any
+    # number of workers. With seed=None fresh entropy is drawn and returned
+    # in the result so the run can be reproduced.
+    entropy = np.random.SeedSequence(seed).entropy
+    sizes = shard_sizes(simulations, shard_size)
+    jobs = [(entropy, i, n, chunk_size, n_cards, reveals) for i, n in enumerate(sizes)]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) <= 1:
+        results = map(_run_shard, jobs)
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            results = list(pool.map(_run_shard, jobs))
+    switch_wins = stay_wins = 0
+    for sw, sy in results:
+        switch_wins += sw
+        stay_wins += sy
+    return {
+        "games": int(simulations),
+        "switch_wins": switch_wins,
+        "stay_wins": stay_wins,
+        "seed": entropy,
+        "shards": len(jobs),
+    }
+
+
+# --- Streaming runner with early stopping ---
+FIRST_CHUNK = 1_000  # first partial result after a few milliseconds
+CHUNK_GROWTH = 2
+
+
+def confidence_half_width(wins, games, confidence=0.95):
+    # Normal-approximation half-width of the CI for a win rate
+    from statistics import NormalDist
+
+    if games == 0:
+        return float("inf")
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    p = wins / games
+    return z * math.sqrt(max(p * (1 - p), 0.25 / games) / games)
+
+
+def simulate_stream(seed=None, target_width=None, max_games=None, confidence=0.95,
+                    first_chunk=FIRST_CHUNK, max_chunk=DEFAULT_CHUNK,
+                    n_cards=N_CARDS, reveals=1):
+    # Generator of running totals, one dict per chunk. Chunks start small and
+    # double up to max_chunk. Stops once both win rates' confidence intervals
+    # are narrower than target_width (full width), or after max_games; with
+    # neither set it runs until the caller stops iterating.
+    rng = np.random.default_rng(seed)
+    games = switch_wins = stay_wins = 0
+    size = first_chunk
+    while True:
+        if max_games is not None:
+            size = min(size, max_games - games)
+            if size <= 0:
+                return
+        sw, sy = simulate_chunk(rng, size, n_cards, reveals)
+        games += size
+        switch_wins += sw
+        stay_wins += sy
+        width = 2 * max(confidence_half_width(switch_wins, games, confidence),
+                        confidence_half_width(stay_wins, games, confidence))
+        converged = target_width is not None and width <= target_width
+        yield {
+            "games": games,
+            "switch_wins": switch_wins,
+            "stay_wins": stay_wins,
+            "switch_rate": switch_wins / games,
+            "stay_rate": stay_wins / games,
+            "ci_width": width,
+            "converged": converged,
+        }
+        if converged:
+            return
+        size = min(size * CHUNK_GROWTH, max_chunk)
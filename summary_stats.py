@@ -0,0 +1,80 @@
+# summary_stats.py
+# Switch/stay outcome counters kept up to date as rounds are logged, and a
+# memoized chart of them. Rendering a summary page is then O(1): the chart is
+# rebuilt only when the counts change, and figures are never registered
+# with pyplot, so nothing is left open between reruns.
+import io
+
+import streamlit as st
+
+from profiling import stage
+
+
+class OutcomeCounts:
+    __slots__ = ("switch_wins", "switch_losses", "stay_wins", "stay_losses")
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.switch_wins = 0
+        self.switch_losses = 0
+        self.stay_wins = 0
+        self.stay_losses = 0
+
+    def record(self, first, second, won):
+        if first != second:
+            if won:
+                self.switch_wins += 1
+            else:
+                self.switch_losses += 1
+        elif won:
+            self.stay_wins += 1
+        else:
+            self.stay_losses += 1
+
+    @property
+    def total(self):
+        return self.switch_wins + self.switch_losses + self.stay_wins + self.stay_losses
+
+    @property
+    def wins(self):
+        return self.switch_wins + self.stay_wins
+
+    def key(self):
+        return (self.switch_wins, self.switch_losses, self.stay_wins, self.stay_losses)
+
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def outcome_chart(key, title):
+    # Grouped bar chart of wins/losses by action as PNG bytes, cached by counts.
+    # matplotlib is only imported once a summary page needs a chart.
+    import numpy as np
+    from matplotlib.figure import Figure
+
+    switch_wins, switch_losses, stay_wins, stay_losses = key
+    labels = ['Switch', 'Stay']
+    wins = [switch_wins, stay_wins]
+    losses = [switch_losses, stay_losses]
+
+    x = np.arange(len(labels))
+    width = 0.35
+
+    fig = Figure()
+    ax = fig.subplots()
+    ax.bar(x - width/2, wins, width, label='Wins')
+    ax.bar(x + width/2, losses, width, label='Losses')
+    ax.set_ylabel('Count')
+    ax.set_title(title)
+    ax.set_xticks(x)
+    ax.set_xticklabels(labels)
+    ax.legend()
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png")
+    return buf.getvalue()
+
+
+def show_outcome_chart(counts, title):
+    with stage("summary_chart"):
+        png = outcome_chart(counts.key(), title)
+    st.image(png)
@@ -0,0 +1,120 @@
+import os
+import time
+
+from persistence import content_hash
+from round_log import GAME_LOG_COLUMNS
+from round_wal import SESSION_DIR, Compactor, RoundWAL, load_done, segment_files
+
+HOUR = 3600.0
+
+
+def row(n):
+    return dict(round_number=n, first_choice=0, flipped_card=1, second_choice=2,
+                result=n % 2 == 0, phase_type=1, trophy_card=0)
+
+
+class Storage:
+    # Stands in for the ResultWriter: submitted files wait in `queued` until
+    # write() lands them
+    def __init__(self, auto=True):
+        self.auto = auto
+        self.files, self.queued, self.submits = {}, {}, []
+
+    def submit(self, path, content, player_name, session_id):
+        self.submits.append((path, content.count("\n") - 1))
+        self.queued[path] = content
+        if self.auto:
+            self.write()
+        return path
+
+    def write(self):
+        self.files.update(self.queued)
+        self.queued.clear()
+
+    def stored(self, player_name, digest):
+        return any(content_hash(c) == digest for c in self.files.values())
+
+    def rows(self, path):
+        return self.files[path].count("\n") - 1
+
+
+def append(wal, sid, seqs):
+    for seq in seqs:
+        wal.append_round(sid, "p", GAME_LOG_COLUMNS, seq, row(seq + 1))
+
+
+def test_deleted_segment_never_truncates_a_written_session(tmp_path):
+    directory = str(tmp_path)
+    storage = Storage()
+    compactor = Compactor(directory, storage.submit, storage.stored)
+    first, second = RoundWAL(directory), RoundWAL(directory)
+    append(first, "s", range(3))
+    first.close()  # worker 1 dies; its segment is no longer held
+    append(second, "s", range(3, 6))
+    second.close_session("s", "player_logs/p_closed.csv")
+
+    assert compactor.compact() == 1
+    assert len(segment_files(directory)) == 1  # worker 1's segment is gone
+    assert compactor.compact() == 0
+    assert storage.submits == [("player_logs/p_closed.csv", 6)]
+    assert storage.rows("player_logs/p_closed.csv") == 6
+    assert load_done(directory) == {"s": {"path": "player_logs/p_closed.csv", "rows": 6}}
+
+    # Records that arrive for a final session never rewrite its file
+    append(second, "s", [0])
+    second.close()
+    compactor.compact()
+    assert len(storage.submits) == 1
+    assert segment_files(directory) == []
+
+
+def test_session_is_final_only_once_its_file_is_stored(tmp_path):
+    directory = str(tmp_path)
+    storage = Storage(auto=False)
+    compactor = Compactor(directory, storage.submit, storage.stored)
+    wal = RoundWAL(directory)
+    append(wal, "s", range(2))
+    wal.close_session("s", "player_logs/p_closed.csv")
+    wal.close()
+
+    compactor.compact()
+    assert load_done(directory) == {}
+    assert segment_files(directory) == []
+    assert os.listdir(os.path.join(directory, SESSION_DIR)) == ["s.json"]
+
+    storage.queued.clear()  # the writer gave up; the next pass submits again
+    compactor.compact()
+    storage.write()
+    compactor.compact()
+    assert [rows for _, rows in storage.submits] == [2, 2]
+    assert storage.rows("player_logs/p_closed.csv") == 2
+    assert "s" in load_done(directory)
+    assert os.listdir(os.path.join(directory, SESSION_DIR)) == []
+
+
+def test_abandoned_session_is_collected_and_keeps_its_path(tmp_path, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: clock[0])
+    directory = str(tmp_path)
+    storage = Storage()
+    compactor = Compactor(directory, storage.submit, storage.stored, abandon_after=HOUR)
+    wal = RoundWAL(directory)
+    append(wal, "gone", range(2))
+    clock[0] += 2 * HOUR
+    append(wal, "busy", range(1))  # same segment, still being written
+
+    # Aged by its own records, not by the segment it shares
+    assert compactor.compact() == 1
+    (path, rows), = storage.submits
+    assert rows == 2
+    wal.close()
+    compactor.compact()
+    assert segment_files(directory) == []
+
+    # The participant comes back: a close with no new rows adds no file
+    resumed = RoundWAL(directory)
+    resumed.close_session("gone", "player_logs/p_later.csv")
+    resumed.close()
+    compactor.compact()
+    assert len(storage.submits) == 1
+    assert load_done(directory) == {"gone": {"path": path, "rows": 2}}
@@ -0,0 +1,163 @@
+# tournament.py
+# Synthetic agents playing the montyhall_not_ok.py point rules, for tuning
+# the start points, win bonus and action cost before running a cohort:
+#   start with `start` points, +`bonus` per win; switching costs `cost` in
+#   round set 1, staying costs `cost` in round set 2; trials are free; a
+#   costly action is refused when points < cost, so the agent has to take
+#   the other one.
+# Every setting and agent is one cell of a (settings, agents) array and the
+# engine loops only over rounds, so a sweep over thousands of settings is a
+# few dozen NumPy operations per round. All agent types play the same games
+# (common random numbers), which keeps strategy comparisons low-variance.
+#
+#   python tournament.py [--costs 0 5 10 20] [--bonuses 50 100] [--agents 10000]
+import argparse
+import itertools
+
+import numpy as np
+import pandas as pd
+
+# Same defaults as montyhall_not_ok.py
+START_POINTS = 50
+WIN_BONUS = 100
+ACTION_COST = 10
+TRIALS = 10
+ROUNDS_PER_SET = 3
+N_CARDS = 3
+
+AGENTS = ("always_switch", "always_stay", "mixed", "greedy", "win_stay_lose_shift")
+DEFAULT_AGENTS = 10_000
+BATCH_CELLS = 5_000_000  # largest (settings x agents) block played at once
+
+
+class Agents:
+    # Vectorized policy state for one agent type over a (settings, agents) block.
+    # choose() returns a bool array (True = switch); observe() feeds back the
+    # action taken and whether it won.
+    def __init__(self, kind, shape, rng, p_switch=0.5, epsilon=0.1):
+        if kind not in AGENTS:
+            raise ValueError(f"Unknown agent: {kind}")
+        self.kind = kind
+        self.shape = shape
+        self.rng = rng
+        self.p_switch = p_switch
+        self.epsilon = epsilon
+        # Beta(1, 1) prior on each action's win rate
+        self.plays = np.ones((2,) + shape)  # [stay, switch]
+        self.wins = np.full((2,) + shape, 0.5)
+        self.last_switch = None
+        self.last_won = None
+
+    def choose(self, bonus, switch_cost, stay_cost):
+        if self.kind == "always_switch":
+            return np.ones(self.shape, dtype=bool)
+        if self.kind == "always_stay":
+            return np.zeros(self.shape, dtype=bool)
+        coin = self.rng.random(self.shape)
+        if self.kind == "mixed":
+            return coin < self.p_switch
+        if self.kind == "win_stay_lose_shift":
+            if self.last_switch is None:
+                return coin < 0.5
+            return np.where(self.last_won, self.last_switch, ~self.last_switch)
+        # greedy: expected points of each action from the observed win rates,
+        # with epsilon exploration and random tie-breaks
+        rate = self.wins / self.plays
+        value_switch = bonus * rate[1] - switch_cost
+        value_stay = bonus * rate[0] - stay_cost
+        best = np.where(value_switch == value_stay, coin < 0.5, value_switch > value_stay)
+        explore = self.rng.random(self.shape) < self.epsilon
+        return np.where(explore, coin < 0.5, best)
+
+    def observe(self, switched, won):
+        self.last_switch = switched
+        self.last_won = won
+        if self.kind == "greedy":
+            self.plays[1] += switched
+            self.plays[0] += ~switched
+            self.wins[1] += switched & won
+            self.wins[0] += ~switched & won
+
+
+def play(kind, start, bonus, cost, n_agents, rng, games, trials=TRIALS,
+         rounds_per_set=ROUNDS_PER_SET, **agent_args):
+    # start, bonus, cost: (settings,) arrays. games: bool array
+    # (trials + 2 * rounds_per_set, settings, n_agents), True where the first
+    # pick is the trophy (staying wins). Returns final points, switch counts
+    # and refused actions, each (settings, n_agents).
+    shape = (len(cost), n_agents)
+    start, bonus, cost = (np.asarray(a, dtype=np.int64)[:, None] for a in (start, bonus, cost))
+    agents = Agents(kind, shape, rng, **agent_args)
+    zero = np.zeros_like(cost)
+    for t in range(trials):
+        switched = agents.choose(bonus, zero, zero)
+        agents.observe(switched, switched != games[t])
+
+    points = np.broadcast_to(start, shape).copy()
+    switches = np.zeros(shape, dtype=np.int64)
+    refused = np.zeros(shape, dtype=np.int64)
+    for r in range(2 * rounds_per_set):
+        first_set = r < rounds_per_set
+        switch_cost, stay_cost = (cost, zero) if first_set else (zero, cost)
+        wants_switch = agents.choose(bonus, switch_cost, stay_cost)
+        costly = wants_switch if first_set else ~wants_switch
+        blocked = costly & (points < cost)
+        switched = wants_switch ^ blocked
+        paid = switched if first_set else ~switched
+        won = switched != games[trials + r]
+        points -= cost * paid
+        points += bonus * won
+        switches += switched
+        refused += blocked
+        agents.observe(switched, won)
+    return points, switches, refused
+
+
+def _summarize(kind, start, bonus, cost, points, switches, refused, rounds):
+    return pd.DataFrame({
+        "agent": kind,
+        "start": start,
+        "bonus": bonus,
+        "cost": cost,
+        "mean_points": points.mean(axis=1),
+        "var_points": points.var(axis=1, ddof=1),
+        "sem_points": points.std(axis=1, ddof=1) / np.sqrt(points.shape[1]),
+        "switch_rate": switches.mean(axis=1) / rounds,
+        "refused_rate": refused.mean(axis=1) / rounds,
+    })
+
+
+def tournament(costs=(ACTION_COST,), bonuses=(WIN_BONUS,), starts=(START_POINTS,),
+               agents=AGENTS, n_agents=DEFAULT_AGENTS, seed=None, trials=TRIALS,
+               rounds_per_set=ROUNDS_PER_SET, **agent_args):
+    # Every combination of start, bonus and cost against every agent type.
+    # One row per (agent, setting) with the mean and variance of final points.
+    grid = np.array(list(itertools.product(starts, bonuses, costs)), dtype=np.int64).reshape(-1, 3)
+    rounds = trials + 2 * rounds_per_set
+    step = max(1, BATCH_CELLS // (n_agents * rounds))
+    entropy = np.random.SeedSequence(seed).entropy
+    frames = []
+    for b, lo in enumerate(range(0, len(grid), step)):
+        block = grid[lo:lo + step]
+        # Block b: one stream for the games, one per agent type
+        game_seq, *agent_seqs = np.random.SeedSequence(entropy, spawn_key=(b,)).spawn(1 + len(agents))
+        games = np.random.default_rng(game_seq).random((rounds, len(block), n_agents)) < 1 / N_CARDS
+        for kind, seq in zip(agents, agent_seqs):
+            points, switches, refused = play(kind, block[:, 0], block[:, 1], block[:, 2], n_agents,
+                                             np.random.default_rng(seq), games, trials,
+                                             rounds_per_set, **agent_args)
+            frames.append(_summarize(kind, block[:, 0], block[:, 1], block[:, 2],
+                                     points, switches, refused, 2 * rounds_per_set))
+    return pd.concat(frames, ignore_index=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run synthetic agents through the point-cost rules")
+    parser.add_argument("--costs", type=int, nargs="+", default=[ACTION_COST])
+    parser.add_argument("--bonuses", type=int, nargs="+", default=[WIN_BONUS])
+    parser.add_argument("--starts", type=int, nargs="+", default=[START_POINTS])
+    parser.add_argument("--agents", type=int, default=DEFAULT_AGENTS)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    result = tournament(args.costs, args.bonuses, args.starts, n_agents=args.agents, seed=args.seed)
+    print(result.to_string(index=False, float_format="%.3f"))
@@ -0,0 +1,100 @@
+# trial_schedule.py
+# Pre-generated, seeded round layouts (trophy position + host tie-break),
+# counterbalanced across the cohort, so every session can be replayed
+# exactly. Each session is enrolled into a slot (enroll(); the slot is
+# written to every log row as schedule_key). Slots come in cycles of
+# n*(n-1), and for every round index each cycle gets a fresh permutation of
+# the n*(n-1) (trophy, tie_break) pairs, one per slot: any n*(n-1)
+# consecutive participants see every pair exactly once in every round.
+# Within one session each round's layout is an independent, uniform draw, so
+# earlier rounds reveal nothing about later ones, and nobody can work out
+# their own sequence without the cohort seed (MONTYHALL_COHORT_SEED, to be
+# set per cohort and kept private).
+# Permutations are drawn in chunks of BLOCK_ROUNDS rounds; chunk b of a
+# cycle's stream is seeded by (cohort seed, stream, cycle, b) and shared by
+# all slots of the cycle, so any round is reproducible on its own. Looking up
+# a round is O(1).
+import itertools
+import os
+import secrets
+import threading
+import zlib
+from functools import lru_cache
+from typing import NamedTuple
+
+from session_store import SESSION_STORE
+
+COHORT_SEED = int(os.environ.get("MONTYHALL_COHORT_SEED", "0"))
+BLOCK_ROUNDS = 64
+
+
+class RoundLayout(NamedTuple):
+    trophy: int
+    tie_break: int  # which of the host's candidate cards to flip
+
+
+# --- Enrollment ---
+# Without a shared session store each process counts from its own random
+# point, so slots of different workers do not collide and balance holds per
+# process
+_local_slots = itertools.count(secrets.randbelow(2 ** 32) << 16)
+_local_lock = threading.Lock()
+
+
+def enroll():
+    # Next slot of the cohort
+    if SESSION_STORE is not None:
+        return SESSION_STORE.next_value("schedule_slot")
+    with _local_lock:
+        return next(_local_slots)
+
+
+# --- Layouts ---
+@lru_cache(maxsize=256)
+def _permutations(cohort_seed, stream, n_cards, cycle, block):
+    # (BLOCK_ROUNDS, n*(n-1)) array; row r is round r's pair for each slot
+    import numpy as np
+
+    seq = np.random.SeedSequence(cohort_seed, spawn_key=(stream, cycle, block))
+    pairs = np.tile(np.arange(n_cards * (n_cards - 1)), (BLOCK_ROUNDS, 1))
+    return np.random.default_rng(seq).permuted(pairs, axis=1)
+
+
+class Schedule:
+    __slots__ = ("cohort_seed", "slot", "stream", "n_cards", "_layouts", "_lock")
+
+    def __init__(self, slot, stream="experiment", n_cards=3, cohort_seed=COHORT_SEED):
+        self.cohort_seed = cohort_seed
+        self.slot = int(slot)
+        self.stream = zlib.crc32(stream.encode("utf-8"))
+        self.n_cards = n_cards
+        self._layouts = []
+        self._lock = threading.Lock()
+
+    def _block(self, index):
+        ties = self.n_cards - 1
+        cycle, position = divmod(self.slot, self.n_cards * ties)
+        pairs = _permutations(self.cohort_seed, self.stream, self.n_cards, cycle, index)[:, position]
+        return [RoundLayout(int(i) // ties, int(i) % ties) for i in pairs]
+
+    def layout(self, index):
+        if index >= len(self._layouts):
+            with self._lock:
+                while index >= len(self._layouts):
+                    self._layouts.extend(self._block(len(self._layouts) // BLOCK_ROUNDS))
+        return self._layouts[index]
+
+    def layouts(self, count):
+        self.layout(count - 1)
+        return self._layouts[:count]
+
+
+@lru_cache(maxsize=4096)
+def schedule_for(slot, stream="experiment", n_cards=3, cohort_seed=COHORT_SEED):
+    return Schedule(slot, stream, n_cards, cohort_seed)
+
+
+def cohort_schedules(slots, rounds, stream="experiment", n_cards=3, cohort_seed=COHORT_SEED):
+    # Precompute the first `rounds` layouts for a whole cohort
+    return {slot: schedule_for(slot, stream, n_cards, cohort_seed).layouts(rounds)
+            for slot in slots}